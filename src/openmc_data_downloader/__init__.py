@@ -13,5 +13,26 @@ except PackageNotFoundError:
 
 __all__ = ["__version__"]
 
+import logging
+
+# messages are only shown once the application configures logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+from . import cross_sections_directory
 from .cross_sections_directory import *
+from .bundle import extract_bundle, write_bundle
+from .cache import DownloadCache
+from .connection_pool import ConnectionPool
+from .locks import FileLock, LockTimeout, lock_path_for
+from .manifest import diff_manifest, read_manifest, write_manifest
+from .mirrors import configured_mirrors, parse_mirrors, rank_mirrors
+from .report import DownloadReport, FileMetrics
+from .retries import RetryPolicy, StalledDownloadError
 from .utils import *
+
+
+def __getattr__(name):
+    # the option lists and xs_info tables are built on first use
+    if name in cross_sections_directory.LAZY_ATTRIBUTES:
+        return getattr(cross_sections_directory, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
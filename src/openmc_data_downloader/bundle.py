@@ -0,0 +1,185 @@
+"""
+A bundle is a tar archive of downloaded files for copying a library to a
+machine without network access. The first member of the archive is a
+manifest of the files, see openmc_data_downloader.manifest, followed by the
+files themselves. Bundles are written and read as a stream so the archive
+is never held in memory and each file is read once.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import tarfile
+import uuid
+from pathlib import Path
+from typing import List, Union
+
+from openmc_data_downloader.manifest import (
+    describe_files,
+    manifest_text,
+    parse_manifest,
+)
+
+_logger = logging.getLogger(__name__)
+
+BUNDLE_MANIFEST = "manifest.json"
+
+# the compression of a bundle is chosen by the extension of the archive
+_COMPRESSIONS = {".gz": "gz", ".tgz": "gz", ".bz2": "bz2", ".xz": "xz"}
+
+_BUFFER_SIZE = 1024 * 1024
+
+
+def write_bundle(
+    records: List[dict],
+    destination: Union[str, Path],
+    archive: Union[str, Path],
+    max_workers: int = 4,
+) -> Path:
+    """Writes the downloaded files and a manifest of them to a bundle
+
+    Arguments:
+        records: The rows of the plan the files were downloaded from, each
+            with at least library, url and local_file
+        destination: The folder the files were downloaded to
+        archive: The bundle to write. Archives ending in .gz, .tgz, .bz2 or
+            .xz are compressed
+        max_workers: The maximum number of files checksummed at the same time
+
+    Returns
+        The path of the bundle
+    """
+
+    destination = Path("." if destination is None else destination)
+    archive = Path(archive)
+    files = describe_files(records, destination, max_workers)
+    manifest = manifest_text(files).encode()
+
+    compression = _COMPRESSIONS.get(archive.suffix, "")
+    tmp_path = archive.with_name(f".{archive.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with tarfile.open(str(tmp_path), f"w|{compression}") as tar:
+            info = tarfile.TarInfo(BUNDLE_MANIFEST)
+            info.size = len(manifest)
+            tar.addfile(info, io.BytesIO(manifest))
+            for entry in files:
+                # opened first so files linked from a cache are added as files
+                with open(destination / entry["local_file"], "rb") as fh:
+                    info = tar.gettarinfo(arcname=entry["local_file"], fileobj=fh)
+                    tar.addfile(info, fh)
+        os.replace(tmp_path, archive)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    _logger.info("written bundle of %d files to %s", len(files), archive)
+
+    return archive
+
+
+def extract_bundle(
+    archive: Union[str, Path], destination: Union[str, Path]
+) -> List[dict]:
+    """Extracts the files of a bundle into the destination. Each file is
+    checked against the size and checksum in the manifest as it is written
+    so no file is read again afterwards.
+
+    Arguments:
+        archive: The bundle to extract
+        destination: The folder to extract the files to
+
+    Returns
+        The manifest entry of each file in the bundle
+    """
+
+    destination = Path("." if destination is None else destination)
+    destination.mkdir(parents=True, exist_ok=True)
+
+    try:
+        tar = tarfile.open(str(archive), "r|*")
+    except tarfile.ReadError as error:
+        raise ValueError(f"{archive} is not a bundle, {error}") from error
+
+    with tar:
+        member = tar.next()
+        if member is None or member.name != BUNDLE_MANIFEST:
+            raise ValueError(f"{archive} is not a bundle, {BUNDLE_MANIFEST} is missing")
+        entries = parse_manifest(tar.extractfile(member).read().decode(), archive)
+        # the manifest comes from the same archive as the files so names such
+        # as ../file are rejected before anything is written
+        for entry in entries:
+            _check_local_file(entry["local_file"], destination, archive)
+
+        # only the listed files are extracted
+        listed = {entry["local_file"]: entry for entry in entries}
+        extracted = set()
+        # iterating over the archive would start again from the manifest
+        while True:
+            member = tar.next()
+            if member is None:
+                break
+            entry = listed.get(member.name)
+            if entry is None or not member.isfile():
+                raise ValueError(
+                    f"{member.name} in {archive} is not listed in its manifest"
+                )
+            _extract_file(tar.extractfile(member), destination, entry)
+            extracted.add(member.name)
+
+    missing = [name for name in listed if name not in extracted]
+    if missing:
+        raise RuntimeError(
+            f"{len(missing)} of {len(listed)} files are missing from {archive}\n"
+            + "\n".join(missing)
+        )
+
+    _logger.info("extracted %d files from %s to %s", len(entries), archive, destination)
+
+    return entries
+
+
+def _check_local_file(name: str, destination: Path, archive) -> None:
+    """Raises ValueError unless name is a plain file name in the destination"""
+
+    if (
+        not isinstance(name, str)
+        or not name
+        or Path(name).name != name
+        or name in (".", "..")
+        # files already in the destination may be links into a cache so the
+        # path is made absolute without following links
+        or Path(os.path.abspath(destination / name)).parent
+        != Path(os.path.abspath(destination))
+    ):
+        raise ValueError(
+            f"The manifest of {archive} lists {name!r}, files in a bundle must "
+            "be plain file names inside the destination"
+        )
+
+
+def _extract_file(source, destination: Path, entry: dict) -> Path:
+    local_path = destination / entry["local_file"]
+    tmp_path = local_path.with_name(f".{local_path.name}.{uuid.uuid4().hex}.tmp")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as fh:
+            while True:
+                chunk = source.read(_BUFFER_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                fh.write(chunk)
+                size += len(chunk)
+        if size != entry["size"] or digest.hexdigest() != entry["sha256"]:
+            raise RuntimeError(
+                f"{entry['local_file']} does not match the checksum in the manifest"
+            )
+        os.replace(tmp_path, local_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return local_path
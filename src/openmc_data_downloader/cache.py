@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Optional, Union
+
+CACHE_ENVIRONMENTAL_VARIABLE = "OPENMC_DATA_DOWNLOADER_CACHE"
+LINK_MODES = ("auto", "hardlink", "reflink", "symlink", "copy")
+
+# ioctl request number that clones a file on Linux file systems with
+# copy-on-write support such as btrfs and xfs
+_FICLONE = 0x40049409
+
+
+class DownloadCache:
+    """A content addressed store of downloaded files shared between
+    destinations. Each file is stored once under objects/ named by its
+    sha256 checksum and refs/<library>/<remote_file> records which object a
+    remote file was downloaded to. New destinations are filled from the
+    cache with links so each file is only downloaded once per machine.
+
+    Arguments:
+        directory: The folder the cache is kept in. Defaults to the
+            OPENMC_DATA_DOWNLOADER_CACHE environmental variable so the cache
+            can be configured for a user or for a whole site
+        link_mode: How files are placed in a destination, one of "hardlink",
+            "reflink", "symlink" or "copy". "auto" tries a hardlink, then a
+            reflink and then a symlink
+        verify: If True the checksum of a cached file is checked every time
+            it is used, otherwise only its size is checked
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, Path]] = None,
+        link_mode: str = "auto",
+        verify: bool = False,
+    ):
+        if directory is None:
+            directory = os.environ.get(CACHE_ENVIRONMENTAL_VARIABLE)
+        if directory is None:
+            raise ValueError(
+                "A cache directory must be provided or the "
+                f"{CACHE_ENVIRONMENTAL_VARIABLE} environmental variable set"
+            )
+        if link_mode not in LINK_MODES:
+            raise ValueError(
+                f"The link_mode must be one of the following {LINK_MODES}. Not {link_mode}"
+            )
+
+        self.directory = Path(directory)
+        self.link_mode = link_mode
+        self.verify = verify
+
+    def __repr__(self):
+        return f"DownloadCache({str(self.directory)!r}, link_mode={self.link_mode!r})"
+
+    def _ref_path(self, key: str) -> Path:
+        return self.directory / "refs" / key
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.directory / "objects" / sha256[:2] / sha256
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Finds the cached file for the key
+
+        Arguments:
+            key: The library and remote file, e.g. "TENDL-2019/Fe56.h5"
+
+        Returns
+            The path of the cached file or None if it is not in the cache
+        """
+
+        ref_path = self._ref_path(key)
+        if not ref_path.is_file():
+            return None
+        ref = json.loads(ref_path.read_text())
+
+        object_path = self._object_path(ref["sha256"])
+        if not object_path.is_file() or object_path.stat().st_size != ref["size"]:
+            return None
+        if self.verify and file_sha256(object_path) != ref["sha256"]:
+            return None
+        return object_path
+
+    def store(self, key: str, path: Union[str, Path], url: str = None) -> Path:
+        """Adds a downloaded file to the cache
+
+        Arguments:
+            key: The library and remote file, e.g. "TENDL-2019/Fe56.h5"
+            path: The downloaded file
+            url: The url the file was downloaded from, kept for reference
+
+        Returns
+            The path of the cached file
+        """
+
+        path = Path(path)
+        sha256 = file_sha256(path)
+        object_path = self._object_path(sha256)
+        if not object_path.is_file():
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            _place_file(path, object_path, ("hardlink", "copy"))
+
+        ref = {"sha256": sha256, "size": object_path.stat().st_size, "url": url}
+        _write_text_atomically(self._ref_path(key), json.dumps(ref))
+
+        return object_path
+
+    def link(self, key: str, local_path: Union[str, Path]) -> bool:
+        """Places the cached file for the key at local_path, replacing any
+        file already there.
+
+        Arguments:
+            key: The library and remote file, e.g. "TENDL-2019/Fe56.h5"
+            local_path: Where the file is needed
+
+        Returns
+            True if the file was in the cache, otherwise False
+        """
+
+        object_path = self.lookup(key)
+        if object_path is None:
+            return False
+
+        if self.link_mode == "auto":
+            modes = ("hardlink", "reflink", "symlink")
+        else:
+            modes = (self.link_mode,)
+        _place_file(object_path, Path(local_path), modes)
+        return True
+
+
+def file_sha256(path: Union[str, Path]) -> str:
+    """Returns the sha256 checksum of the file as a hex string"""
+
+    sha256 = hashlib.sha256()
+    buffer = memoryview(bytearray(1024 * 1024))
+    with open(path, "rb") as fh:
+        while True:
+            count = fh.readinto(buffer)
+            if not count:
+                break
+            sha256.update(buffer[:count])
+    return sha256.hexdigest()
+
+
+def _place_file(source: Path, target: Path, modes) -> None:
+    """Makes target a link to or copy of source using the first of the
+    modes that works. The link is made under a temporary name and renamed
+    over target so target is never partially written."""
+
+    temporary = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+    for mode in modes:
+        try:
+            if mode == "hardlink":
+                os.link(source, temporary)
+            elif mode == "reflink":
+                _reflink(source, temporary)
+            elif mode == "symlink":
+                os.symlink(source.absolute(), temporary)
+            else:
+                shutil.copyfile(source, temporary)
+        except OSError:
+            temporary.unlink(missing_ok=True)
+            if mode == modes[-1]:
+                raise
+            continue
+        os.replace(temporary, target)
+        return
+
+
+def _reflink(source: Path, target: Path) -> None:
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("reflinks are not supported on this platform")
+
+    with open(source, "rb") as source_fh, open(target, "wb") as target_fh:
+        fcntl.ioctl(target_fh.fileno(), _FICLONE, source_fh.fileno())
+
+
+def _write_text_atomically(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    temporary.write_text(text)
+    os.replace(temporary, path)
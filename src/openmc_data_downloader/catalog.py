@@ -0,0 +1,68 @@
+"""
+The names of the files available in each nuclear data library, prebuilt from
+the bundled *_cross_sections.xml files into catalog.json so that importing the
+package does not need to parse any XML. After changing one of the XML files
+regenerate the catalog with
+
+    python -m openmc_data_downloader.catalog
+"""
+
+import json
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from pathlib import Path
+
+CATALOG_PATH = Path(__file__).parent / "catalog.json"
+
+# the bundled cross_sections.xml file of each library
+LIBRARY_XMLS = {
+    "FENDL-3.1d": "fendl_3.1d_cross_sections.xml",
+    "ENDFB-8.0-NNDC": "nndc_8.0_cross_sections.xml",
+    "ENDFB-7.1-NNDC": "nndc_7.1_cross_sections.xml",
+    "TENDL-2019": "tendl_2019_cross_sections.xml",
+}
+
+# the cross_sections.xml type used for each particle
+PARTICLE_TO_XML_TYPE = {"neutron": "neutron", "photon": "photon", "sab": "thermal"}
+
+
+def build_catalog() -> dict:
+    """Parses the bundled cross_sections.xml files into a dictionary of
+    {library: {particle: [names of the available files]}} in the order the
+    files appear in each XML file"""
+
+    catalog = {}
+    for library, filename in LIBRARY_XMLS.items():
+        root = ET.parse(Path(__file__).parent / filename).getroot()
+        catalog[library] = {}
+        for particle, xml_type in PARTICLE_TO_XML_TYPE.items():
+            names = [
+                elem.attrib["materials"]
+                for elem in root
+                if elem.attrib["type"] == xml_type
+            ]
+            if names:
+                catalog[library][particle] = names
+    return catalog
+
+
+def write_catalog(path: Path = CATALOG_PATH) -> None:
+    """Writes the catalog built from the bundled XML files to path"""
+
+    with open(path, "w") as fh:
+        json.dump(build_catalog(), fh, separators=(",", ":"))
+        fh.write("\n")
+
+
+@lru_cache(maxsize=None)
+def load_catalog() -> dict:
+    """Reads the prebuilt catalog, see build_catalog for its layout. The
+    catalog is read once and shared so it must not be modified."""
+
+    with open(CATALOG_PATH) as fh:
+        return json.load(fh)
+
+
+if __name__ == "__main__":
+    write_catalog()
+    print(f"written catalog to {CATALOG_PATH}")
@@ -0,0 +1,194 @@
+import base64
+import http.client
+import socket
+import threading
+from contextlib import contextmanager
+from urllib.error import HTTPError
+from urllib.parse import unquote, urljoin, urlparse
+from urllib.request import getproxies, proxy_bypass, urlopen
+
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+_MAX_REDIRECTS = 5
+_USER_AGENT = "openmc_data_downloader"
+
+
+class ConnectionPool:
+    """A thread safe pool of keep-alive HTTP and HTTPS connections. Idle
+    connections are kept per (scheme, host, port) so that every file
+    downloaded from the same host reuses an open connection instead of
+    paying for a new TCP connection and TLS handshake. A connection is only
+    ever used by one thread at a time, it is checked out for the length of a
+    request and returned to the pool once the response has been read.
+
+    Proxies are taken from the http_proxy, https_proxy and no_proxy
+    environmental variables in the same way as urllib.request.urlopen. Http
+    requests are sent to the proxy and https requests are tunnelled through
+    it with CONNECT.
+
+    Attributes:
+        opened: The number of new connections that have been opened
+        reused: The number of requests sent on an already open connection
+    """
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f"ConnectionPool(opened={self.opened}, reused={self.reused})"
+
+    def _checkout(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.reused += 1
+                return idle.pop(), True
+            self.opened += 1
+
+        scheme, host, port, proxy = key
+        if proxy is None:
+            if scheme == "https":
+                return http.client.HTTPSConnection(host, port), False
+            return http.client.HTTPConnection(host, port), False
+
+        proxy = urlparse(proxy)
+        if proxy.scheme == "https":
+            connection = http.client.HTTPSConnection(proxy.hostname, proxy.port)
+        else:
+            connection = http.client.HTTPConnection(proxy.hostname, proxy.port)
+        if scheme == "https":
+            connection.set_tunnel(host, port, headers=_proxy_headers(proxy))
+        return connection, False
+
+    def _checkin(self, key, connection):
+        with self._lock:
+            self._idle.setdefault(key, []).append(connection)
+
+    def _send(self, key, request_path, method, headers, timeout=None):
+        """Sends the request on a pooled connection. A reused connection
+        may have been closed by the server while it was idle, in which case
+        the request is sent again on the next connection."""
+
+        while True:
+            connection, is_reused = self._checkout(key)
+            # set on every request as reused connections keep the timeout of
+            # their previous request
+            connection.timeout = (
+                socket.getdefaulttimeout() if timeout is None else timeout
+            )
+            if connection.sock is not None:
+                connection.sock.settimeout(connection.timeout)
+            try:
+                connection.request(method, request_path, headers=headers)
+                return connection, connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if not is_reused:
+                    raise
+
+    def _finish(self, key, connection, response):
+        """Returns the connection to the pool if the response was read to
+        the end and the server did not ask for it to be closed."""
+
+        if response.isclosed() and not response.will_close:
+            self._checkin(key, connection)
+        else:
+            connection.close()
+
+    @contextmanager
+    def urlopen(self, url, headers=None, method="GET", timeout=None):
+        """Opens the url on a pooled connection, following redirects.
+        Responses with an error status raise urllib.error.HTTPError in the
+        same way as urllib.request.urlopen. Urls that are not http or https
+        are opened with urllib.request.urlopen.
+
+        Arguments:
+            url: URL to open
+            headers: Extra request headers to send
+            method: The HTTP method of the request
+            timeout: The number of seconds to wait for the connection and
+                for each read. If None the default socket timeout is used
+
+        Returns
+            The response, which is a readable file like object
+        """
+
+        if urlparse(url).scheme not in ("http", "https"):
+            options = {} if timeout is None else {"timeout": timeout}
+            with urlopen(url, **options) as response:
+                yield response
+            return
+
+        request_headers = {"User-Agent": _USER_AGENT, "Connection": "keep-alive"}
+        if headers is not None:
+            request_headers.update(headers)
+
+        proxies = getproxies()
+
+        for _ in range(_MAX_REDIRECTS + 1):
+            parsed = urlparse(url)
+            proxy = proxies.get(parsed.scheme)
+            if proxy is not None and proxy_bypass(parsed.hostname):
+                proxy = None
+            if proxy is not None and "://" not in proxy:
+                proxy = "http://" + proxy
+            key = (parsed.scheme, parsed.hostname, parsed.port, proxy)
+
+            request_path = parsed.path or "/"
+            if parsed.query:
+                request_path += "?" + parsed.query
+            send_headers = request_headers
+            if proxy is not None and parsed.scheme == "http":
+                # requests sent to a proxy name the whole url
+                request_path = parsed._replace(fragment="").geturl()
+                send_headers = {**request_headers, **_proxy_headers(urlparse(proxy))}
+
+            connection, response = self._send(
+                key, request_path, method, send_headers, timeout
+            )
+
+            if response.status in _REDIRECT_CODES or response.status >= 400:
+                response.read()
+                self._finish(key, connection, response)
+                if response.status >= 400:
+                    raise HTTPError(
+                        url, response.status, response.reason, response.headers, None
+                    )
+                url = urljoin(url, response.getheader("Location"))
+                continue
+
+            try:
+                yield response
+            finally:
+                self._finish(key, connection, response)
+            return
+
+        raise HTTPError(url, response.status, "Too many redirects", None, None)
+
+    def close(self):
+        """Closes every idle connection in the pool"""
+
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+def _proxy_headers(proxy) -> dict:
+    """The Proxy-Authorization header for the user and password in the
+    parsed url of a proxy, if it has them"""
+
+    if proxy.username is None:
+        return {}
+    credentials = f"{unquote(proxy.username)}:{unquote(proxy.password or '')}"
+    token = base64.b64encode(credentials.encode()).decode("ascii")
+    return {"Proxy-Authorization": f"Basic {token}"}
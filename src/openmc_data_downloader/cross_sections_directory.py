@@ -2,7 +2,7 @@ import re
 import xml.etree.ElementTree as ET
 from pathlib import Path
 
-from numpy import nested_iters
+from openmc_data_downloader.catalog import LIBRARY_XMLS, load_catalog
 
 # from https://github.com/openmc-dev/openmc/blob/develop/openmc/data/data.py
 # remove when pip install openmc via PyPi is available
@@ -168,7 +168,7 @@ def populate_neutron_cross_section_list(isotopes, base_url, library):
         entry = core_dict_entry(library, isotope, base_url)
         entry["particle"] = "neutron"
         entry["isotope"] = isotope
-        entry["element"] = re.split(r"(\d+)", entry["isotope"])[0]
+        entry["element"] = _ELEMENT_PATTERN.match(isotope).group()
         xs_info.append(entry)
     return xs_info
 
@@ -195,9 +195,11 @@ def populate_photon_cross_section_list(elements, base_url, library):
 
 def get_isotopes_or_elements_info_from_xml(particle_type, library):
     base_url = lib_to_base_url[(library, particle_type)]
-    filename = lib_to_xml[library]
 
-    isotopes_or_elements = get_isotopes_or_elements_from_xml(filename, particle_type)
+    # the names come from the catalog prebuilt from the xml files
+    isotopes_or_elements = load_catalog()[library].get(particle_type, [])
+    if len(isotopes_or_elements) == 0:
+        raise ValueError(f"no {particle_type} were found in {lib_to_xml[library]}")
 
     if particle_type == "photon":
         info = populate_photon_cross_section_list(
@@ -224,12 +226,9 @@ def get_isotopes_or_elements_info_from_xml(particle_type, library):
 #     'library':
 # }
 
-lib_to_xml = {
-    "FENDL-3.1d": "fendl_3.1d_cross_sections.xml",
-    "ENDFB-8.0-NNDC": "nndc_8.0_cross_sections.xml",
-    "ENDFB-7.1-NNDC": "nndc_7.1_cross_sections.xml",
-    "TENDL-2019": "tendl_2019_cross_sections.xml",
-}
+_ELEMENT_PATTERN = re.compile(r"[A-Za-z]+")
+
+lib_to_xml = LIBRARY_XMLS
 lib_to_base_url = {
     (
         "FENDL-3.1d",
@@ -269,27 +268,6 @@ lib_to_base_url = {
     ): "https://github.com/openmc-data-storage/TENDL-2019/raw/main/h5_files/",
 }
 
-neutron_xs_info = []
-neutron_xs_info += get_isotopes_or_elements_info_from_xml("neutron", "TENDL-2019")
-neutron_xs_info += get_isotopes_or_elements_info_from_xml("neutron", "ENDFB-7.1-NNDC")
-neutron_xs_info += get_isotopes_or_elements_info_from_xml("neutron", "FENDL-3.1d")
-neutron_xs_info += get_isotopes_or_elements_info_from_xml("neutron", "ENDFB-8.0-NNDC")
-
-photon_xs_info = []
-photon_xs_info += get_isotopes_or_elements_info_from_xml(
-    "photon",
-    "ENDFB-7.1-NNDC",
-)
-photon_xs_info += get_isotopes_or_elements_info_from_xml("photon", "FENDL-3.1d")
-photon_xs_info += get_isotopes_or_elements_info_from_xml("photon", "ENDFB-8.0-NNDC")
-
-sab_xs_info = []
-sab_xs_info += get_isotopes_or_elements_info_from_xml(
-    "sab",
-    "ENDFB-7.1-NNDC",
-)
-sab_xs_info += get_isotopes_or_elements_info_from_xml("sab", "ENDFB-8.0-NNDC")
-
 ATOMIC_SYMBOL = {
     0: "n",
     1: "H",
@@ -413,11 +391,6 @@ ATOMIC_SYMBOL = {
 }
 
 
-all_libs = []
-for entry in neutron_xs_info:
-    all_libs.append(entry["library"])
-
-LIB_OPTIONS = list(set(all_libs))
 PARTICLE_OPTIONS = ["neutron", "photon", "sab"]
 
 nested_list = list(NATURAL_ABUNDANCE.values())
@@ -425,29 +398,83 @@ nested_list = list(NATURAL_ABUNDANCE.values())
 # should this come from the isotopes available in the xml files
 STABLE_ISOTOPE_OPTIONS = [item for sublist in nested_list for item in sublist]
 
-ALL_ISOTOPE_OPTIONS = []
-for xml in [
-    "tendl_2019_cross_sections.xml",
-    "nndc_7.1_cross_sections.xml",
-    "nndc_8.0_cross_sections.xml",
-    "fendl_3.1d_cross_sections.xml",
-]:
-    isotopes = get_isotopes_or_elements_from_xml(xml, "neutron")
-    ALL_ISOTOPE_OPTIONS = ALL_ISOTOPE_OPTIONS + isotopes
-
-SAB_OPTIONS = []
-for xml in [
-    "nndc_7.1_cross_sections.xml",
-    "nndc_8.0_cross_sections.xml",
-]:
-    sabs = get_isotopes_or_elements_from_xml(xml, "sab")
-    SAB_OPTIONS = SAB_OPTIONS + sabs
-
-ALL_ISOTOPE_OPTIONS = sorted(list(set(ALL_ISOTOPE_OPTIONS)))
-
-ALL_ELEMENT_OPTIONS = sorted(
-    list(set([re.split(r"(\d+)", i)[0] for i in ALL_ISOTOPE_OPTIONS]))
-)
-STABLE_ELEMENT_OPTIONS = sorted(
-    list(set([re.split(r"(\d+)", i)[0] for i in STABLE_ISOTOPE_OPTIONS]))
-)
+
+# The tables below are built on first use rather than on import, so code that
+# only needs a few of them does not pay for building them all. Each builder
+# is called once by the module __getattr__ and the result is stored as a
+# module attribute.
+
+
+def _build_neutron_xs_info():
+    neutron_xs_info = []
+    for library in ["TENDL-2019", "ENDFB-7.1-NNDC", "FENDL-3.1d", "ENDFB-8.0-NNDC"]:
+        neutron_xs_info += get_isotopes_or_elements_info_from_xml("neutron", library)
+    return neutron_xs_info
+
+
+def _build_photon_xs_info():
+    photon_xs_info = []
+    for library in ["ENDFB-7.1-NNDC", "FENDL-3.1d", "ENDFB-8.0-NNDC"]:
+        photon_xs_info += get_isotopes_or_elements_info_from_xml("photon", library)
+    return photon_xs_info
+
+
+def _build_sab_xs_info():
+    sab_xs_info = []
+    for library in ["ENDFB-7.1-NNDC", "ENDFB-8.0-NNDC"]:
+        sab_xs_info += get_isotopes_or_elements_info_from_xml("sab", library)
+    return sab_xs_info
+
+
+def _build_lib_options():
+    return list(lib_to_xml)
+
+
+def _build_all_isotope_options():
+    all_isotopes = set()
+    for particles in load_catalog().values():
+        all_isotopes.update(particles.get("neutron", []))
+    return sorted(all_isotopes)
+
+
+def _build_sab_options():
+    sab_options = []
+    for library in ["ENDFB-7.1-NNDC", "ENDFB-8.0-NNDC"]:
+        sab_options = sab_options + load_catalog()[library]["sab"]
+    return sab_options
+
+
+def _build_all_element_options():
+    return sorted(
+        set([_ELEMENT_PATTERN.match(i).group() for i in _build_all_isotope_options()])
+    )
+
+
+def _build_stable_element_options():
+    return sorted(
+        set([_ELEMENT_PATTERN.match(i).group() for i in STABLE_ISOTOPE_OPTIONS])
+    )
+
+
+LAZY_ATTRIBUTES = {
+    "neutron_xs_info": _build_neutron_xs_info,
+    "photon_xs_info": _build_photon_xs_info,
+    "sab_xs_info": _build_sab_xs_info,
+    "LIB_OPTIONS": _build_lib_options,
+    "ALL_ISOTOPE_OPTIONS": _build_all_isotope_options,
+    "SAB_OPTIONS": _build_sab_options,
+    "ALL_ELEMENT_OPTIONS": _build_all_element_options,
+    "STABLE_ELEMENT_OPTIONS": _build_stable_element_options,
+}
+
+
+def __getattr__(name):
+    if name not in LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = LAZY_ATTRIBUTES[name]()
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_ATTRIBUTES))
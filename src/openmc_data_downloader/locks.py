@@ -0,0 +1,219 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Union
+
+LOCK_MODES = ("auto", "fcntl", "exclusive")
+
+# seconds after which a lock file that is not refreshed is taken over. NFS
+# clients cache file attributes for up to 60 seconds so a lock file can look
+# older than it is
+STALE_LOCK_TIMEOUT = 600
+
+# how often a process waiting for a lock checks it again
+_POLL_INTERVAL = 0.1
+
+
+class LockTimeout(TimeoutError):
+    """Raised when a lock is not acquired within the timeout"""
+
+
+class FileLock:
+    """An advisory lock on a file shared between processes, including
+    processes on other machines sharing the folder over NFS. By default the
+    lock is taken with fcntl.flock and where that is not available, or not
+    supported by the file system, a lock file is created with O_EXCL
+    instead. The lock file is refreshed while the lock is held so a lock
+    file left behind by a process that died is taken over once it has not
+    been refreshed for stale_after seconds.
+
+    Arguments:
+        path: The lock file, this is created and removed by the lock
+        timeout: The number of seconds to wait for the lock before raising
+            LockTimeout. If None the lock is waited for indefinitely
+        stale_after: The number of seconds after which a lock file that has
+            not been refreshed is treated as stale. Only used by the
+            "exclusive" mode as fcntl locks are released when a process dies.
+            This should be well above the time file attributes are cached
+            for on NFS clients
+        mode: How the lock is taken, one of "fcntl", "exclusive" or "auto"
+            which tries fcntl and falls back to "exclusive"
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        timeout: Optional[float] = None,
+        stale_after: float = STALE_LOCK_TIMEOUT,
+        mode: str = "auto",
+    ):
+        if stale_after <= 0:
+            raise ValueError(f"stale_after must be greater than 0. Not {stale_after}")
+        if mode not in LOCK_MODES:
+            raise ValueError(
+                f"The mode must be one of the following {LOCK_MODES}. Not {mode}"
+            )
+
+        self.path = Path(path)
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.mode = mode
+        # True once the lock has been acquired after waiting for another
+        # process to release it
+        self.waited = False
+        self._fd = None
+        self._held_mode = None
+        self._heartbeat = None
+        self._released = threading.Event()
+
+    def __repr__(self):
+        return f"FileLock({str(self.path)!r}, mode={self.mode!r})"
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def acquire(self) -> None:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.waited = False
+
+        while True:
+            if self.mode in ("auto", "fcntl"):
+                acquired = self._try_fcntl()
+            else:
+                acquired = None
+            if acquired is None:
+                acquired = self._try_exclusive()
+            if acquired:
+                return
+
+            self.waited = True
+            if deadline is not None and time.monotonic() >= deadline:
+                raise LockTimeout(
+                    f"Timed out after {self.timeout}s waiting for the lock {self.path}"
+                )
+            time.sleep(_POLL_INTERVAL)
+
+    def release(self) -> None:
+        if self._held_mode is None:
+            return
+        if self._held_mode == "exclusive":
+            self._released.set()
+            self._heartbeat.join()
+        # the lock file is removed before it is unlocked so a process that
+        # opens it afterwards sees it was replaced, see _try_fcntl
+        _unlink(self.path)
+        os.close(self._fd)
+        self._fd = None
+        self._held_mode = None
+
+    def _try_fcntl(self) -> Optional[bool]:
+        """Returns True if the lock was acquired, False if another process
+        holds it and None if fcntl locks can not be used"""
+
+        try:
+            import fcntl
+        except ImportError:
+            if self.mode == "fcntl":
+                raise
+            return None
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except OSError:
+            # e.g. ENOLCK from an NFS server without a lock manager
+            os.close(fd)
+            if self.mode == "fcntl":
+                raise
+            self.mode = "exclusive"
+            return None
+
+        # the holder removes the lock file when it releases the lock, if that
+        # happened between opening and locking this file the lock is retried
+        # on the new file
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(fd)
+        if current is None or (current.st_dev, current.st_ino) != (
+            opened.st_dev,
+            opened.st_ino,
+        ):
+            os.close(fd)
+            return False
+
+        self._fd = fd
+        self._held_mode = "fcntl"
+        return True
+
+    def _try_exclusive(self) -> bool:
+        """Returns True if the lock file was created"""
+
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            self._remove_if_stale()
+            return False
+
+        os.write(fd, f"{socket.gethostname()} {os.getpid()}\n".encode())
+        self._fd = fd
+        self._held_mode = "exclusive"
+        self._released.clear()
+        self._heartbeat = threading.Thread(target=self._refresh, daemon=True)
+        self._heartbeat.start()
+        return True
+
+    def _refresh(self) -> None:
+        while not self._released.wait(self.stale_after / 4):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                return
+
+    def _remove_if_stale(self) -> None:
+        try:
+            age = time.time() - os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return
+        if age <= self.stale_after:
+            return
+
+        # the lock file is moved aside and checked again so that a lock file
+        # made by another process since the check above is not removed
+        stale_path = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex}")
+        try:
+            os.rename(self.path, stale_path)
+        except FileNotFoundError:
+            return
+        if time.time() - os.stat(stale_path).st_mtime <= self.stale_after:
+            try:
+                os.link(stale_path, self.path)
+            except FileExistsError:
+                pass
+        _unlink(stale_path)
+
+
+def lock_path_for(path: Union[str, Path]) -> Path:
+    """The lock file used for a downloaded file, a hidden file next to it"""
+
+    path = Path(path)
+    return path.with_name(f".{path.name}.lock")
+
+
+def _unlink(path: Path) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,142 @@
+"""
+A manifest records the files resolved for a destination along with the size
+and sha256 checksum of each downloaded file, in the same way as a lockfile.
+The destination can then be synced with the manifest later without
+resolving the libraries again.
+"""
+
+import json
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Tuple, Union
+
+from openmc_data_downloader import cross_sections_directory
+from openmc_data_downloader.cache import _write_text_atomically, file_sha256
+
+_logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def write_manifest(
+    records: List[dict],
+    destination: Union[str, Path],
+    path: Union[str, Path],
+    max_workers: int = 4,
+) -> Path:
+    """Writes a manifest of the downloaded files
+
+    Arguments:
+        records: The rows of the plan the files were downloaded from, each
+            with at least library, url and local_file
+        destination: The folder the files were downloaded to
+        path: The manifest file to write
+        max_workers: The maximum number of files checksummed at the same time
+
+    Returns
+        The path of the manifest file
+    """
+
+    files = describe_files(records, destination, max_workers)
+
+    path = Path(path)
+    _write_text_atomically(path, manifest_text(files))
+    _logger.info("written manifest of %d files to %s", len(files), path)
+
+    return path
+
+
+def describe_files(
+    records: List[dict], destination: Union[str, Path], max_workers: int = 4
+) -> List[dict]:
+    """The manifest entry of each downloaded file, the record with the size
+    and sha256 checksum of the file added"""
+
+    destination = Path("." if destination is None else destination)
+
+    def describe(record):
+        local_path = destination / record["local_file"]
+        # empty columns of the plan, e.g. the sab of a neutron file, are left out
+        entry = {
+            key: value
+            for key, value in record.items()
+            if not (isinstance(value, float) and math.isnan(value))
+        }
+        entry["size"] = local_path.stat().st_size
+        entry["sha256"] = file_sha256(local_path)
+        return entry
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(describe, records))
+
+
+def manifest_text(files: List[dict]) -> str:
+    """The contents of a manifest file listing the files"""
+
+    return json.dumps({"version": MANIFEST_VERSION, "files": files}, indent=2) + "\n"
+
+
+def read_manifest(path: Union[str, Path]) -> List[dict]:
+    """Reads the files listed in a manifest
+
+    Arguments:
+        path: The manifest file to read
+
+    Returns
+        The entry of each file, see write_manifest
+    """
+
+    with open(path) as fh:
+        return parse_manifest(fh.read(), path)
+
+
+def parse_manifest(text: str, path: Union[str, Path]) -> List[dict]:
+    """The files listed in the contents of a manifest read from path"""
+
+    manifest = json.loads(text)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(
+            f"{path} is a version {manifest.get('version')} manifest, "
+            f"only version {MANIFEST_VERSION} is supported"
+        )
+    return manifest["files"]
+
+
+def diff_manifest(
+    entries: List[dict], destination: Union[str, Path]
+) -> Tuple[List[dict], List[Path]]:
+    """Compares a destination with a manifest using only the size of each
+    file, so no file is read
+
+    Arguments:
+        entries: The files listed in the manifest
+        destination: The folder the files should be in
+
+    Returns
+        The entries of the files that are missing or the wrong size, and
+        the downloaded files in the destination that are not in the manifest
+    """
+
+    destination = Path(destination)
+
+    missing = []
+    for entry in entries:
+        try:
+            size = (destination / entry["local_file"]).stat().st_size
+        except FileNotFoundError:
+            size = None
+        if size != entry["size"]:
+            missing.append(entry)
+
+    # only files named like downloads are candidates for removal
+    listed = {entry["local_file"] for entry in entries}
+    prefixes = tuple(f"{library}_" for library in cross_sections_directory.LIB_OPTIONS)
+    unlisted = sorted(
+        path
+        for path in destination.glob("*.h5")
+        if path.name not in listed and path.name.startswith(prefixes)
+    )
+
+    return missing, unlisted
@@ -0,0 +1,195 @@
+"""
+Mirrors are other copies of the nuclear data libraries, for example an
+internal artifact server or a folder on a shared file system, that files are
+downloaded from in place of GitHub. A mirror has the same layout as the
+GitHub repository of the library, e.g. h5_files/neutron/Fe56.h5, so a clone
+of the repository can be used as a mirror.
+
+Mirrors are configured for each library as a list of urls or local folders,
+with "*" for mirrors of every library. "{library}" in a mirror is replaced
+by the name of the library. They are taken from the mirrors argument, then
+the OPENMC_DATA_DOWNLOADER_MIRRORS environmental variable and then the json
+file named by OPENMC_DATA_DOWNLOADER_MIRRORS_FILE, which defaults to
+~/.config/openmc_data_downloader/mirrors.json. The environmental variable
+separates libraries with ";" and mirrors with ",", for example
+
+    TENDL-2019=https://mirror.example.com/tendl/,/data/tendl;*=https://mirror.example.com/{library}/
+"""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
+
+from openmc_data_downloader import cross_sections_directory
+from openmc_data_downloader.retries import RetryPolicy, is_transient
+
+_logger = logging.getLogger(__name__)
+
+MIRRORS_ENVIRONMENTAL_VARIABLE = "OPENMC_DATA_DOWNLOADER_MIRRORS"
+MIRRORS_FILE_ENVIRONMENTAL_VARIABLE = "OPENMC_DATA_DOWNLOADER_MIRRORS_FILE"
+# expanded when the mirrors are loaded so the home directory is only looked
+# up when it is needed and changes to HOME are followed
+DEFAULT_MIRRORS_FILE = "~/.config/openmc_data_downloader/mirrors.json"
+
+# the part of the GitHub urls that the path of each file in a library is
+# relative to
+_REPOSITORY_ROOT = "/raw/main/"
+
+
+def parse_mirrors(text: str) -> Dict[str, List[str]]:
+    """Parses mirrors in the format of the OPENMC_DATA_DOWNLOADER_MIRRORS
+    environmental variable into {library: [mirrors]}"""
+
+    mirrors = {}
+    for entry in text.split(";"):
+        entry = entry.strip()
+        if not entry:
+            continue
+        library, separator, urls = entry.partition("=")
+        if not separator or (
+            library != "*" and library not in cross_sections_directory.LIB_OPTIONS
+        ):
+            # an entry without a library applies to every library
+            library, urls = "*", entry
+        mirrors.setdefault(library, []).extend(
+            url.strip() for url in urls.split(",") if url.strip()
+        )
+    return mirrors
+
+
+def configured_mirrors(
+    mirrors: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, List[str]]:
+    """Finds the configured mirrors
+
+    Arguments:
+        mirrors: {library: [mirrors]} that takes the place of the
+            environmental variable and the mirrors file when given
+
+    Returns
+        The mirrors of each library with "*" for mirrors of every library
+    """
+
+    if mirrors is not None:
+        return mirrors
+
+    text = os.environ.get(MIRRORS_ENVIRONMENTAL_VARIABLE)
+    if text:
+        return parse_mirrors(text)
+
+    # os.path.expanduser leaves the path unchanged rather than raising when
+    # there is no home directory
+    path = Path(
+        os.path.expanduser(
+            os.environ.get(MIRRORS_FILE_ENVIRONMENTAL_VARIABLE, DEFAULT_MIRRORS_FILE)
+        )
+    )
+    if path.is_file():
+        with open(path) as fh:
+            return json.load(fh)
+
+    return {}
+
+
+def library_mirrors(library: str, mirrors: Dict[str, List[str]]) -> List[str]:
+    """The mirrors of the library as base urls ending in "/", local folders
+    are turned into file:// urls"""
+
+    urls = []
+    for mirror in mirrors.get(library, []) + mirrors.get("*", []):
+        mirror = mirror.replace("{library}", library)
+        if len(urlparse(mirror).scheme) <= 1:
+            # a local folder, single letter schemes are windows drives
+            mirror = Path(mirror).expanduser().absolute().as_uri()
+        urls.append(mirror.rstrip("/") + "/")
+    return urls
+
+
+def mirror_url(url: str, mirror: str) -> Optional[str]:
+    """The url of the same file on the mirror or None if the url is not in
+    the layout of a library repository"""
+
+    _, separator, relative_path = url.partition(_REPOSITORY_ROOT)
+    if not separator:
+        return None
+    return mirror + relative_path
+
+
+def rank_mirrors(
+    urls: List[str],
+    pool,
+    timeout: float = 5,
+    max_workers: int = 8,
+    retry_policy: Optional[RetryPolicy] = None,
+    drop_unavailable: bool = False,
+) -> List[str]:
+    """Orders the urls of one file on different mirrors by how quickly each
+    mirror answers a HEAD request for it. Mirrors that fail to answer are
+    put last in their original order, or left out if drop_unavailable.
+
+    Arguments:
+        urls: The url of the same file on each mirror
+        pool: The ConnectionPool to send the requests with
+        timeout: The number of seconds a mirror has to answer
+        max_workers: The maximum number of mirrors probed at the same time
+        retry_policy: How failed probes are retried, the timeout of the
+            probes is always timeout. Defaults to RetryPolicy()
+        drop_unavailable: If True mirrors that fail to answer are left out
+
+    Returns
+        The urls from the fastest to the slowest mirror
+    """
+
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+
+    def head(url):
+        with pool.urlopen(url, method="HEAD", timeout=timeout):
+            pass
+
+    def probe(url):
+        start = time.perf_counter()
+        try:
+            retry_policy.call(head, url)
+        except (HTTPError, URLError) as error:
+            # a mirror that is missing the probed file is still available
+            if not _is_missing_file(error):
+                _logger.warning("Mirror %s is not available, %s", url, error)
+                return None
+        except Exception as error:
+            _logger.warning("Mirror %s is not available, %s", url, error)
+            return None
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(urls)))
+    ) as executor:
+        latencies = list(executor.map(probe, urls))
+
+    healthy = sorted(
+        (latency, position)
+        for position, latency in enumerate(latencies)
+        if latency is not None
+    )
+    unhealthy = [
+        position for position, latency in enumerate(latencies) if latency is None
+    ]
+    if drop_unavailable:
+        unhealthy = []
+    return [urls[position] for _, position in healthy] + [
+        urls[position] for position in unhealthy
+    ]
+
+
+def _is_missing_file(error: Exception) -> bool:
+    """True if the error means the mirror answered but does not have the file"""
+
+    if isinstance(error, HTTPError):
+        return not is_transient(error)
+    return isinstance(error, URLError) and isinstance(error.reason, FileNotFoundError)
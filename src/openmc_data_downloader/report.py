@@ -0,0 +1,183 @@
+"""
+Metrics of downloads. Each file in a batch has a FileMetrics recording how
+it was obtained, how many bytes were transferred and how long it took, and
+a DownloadReport collects them along with totals for the batch so download
+performance can be compared between runs.
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import List, Optional, Union
+
+from openmc_data_downloader.cache import _write_text_atomically
+
+STATUSES = ("downloaded", "cached", "skipped", "reused", "failed")
+
+# the percentiles given for the time and throughput of the files in a batch
+_PERCENTILES = (50, 90, 99)
+
+
+class FileMetrics:
+    """The outcome of one file in a batch
+
+    Attributes:
+        url: The url of the file in the plan
+        local_file: The name of the file in the destination
+        status: How the file was obtained, one of "downloaded", "cached"
+            (linked from the cache), "skipped" (already in the destination),
+            "reused" (downloaded by another process) or "failed"
+        source_url: The url the file was downloaded from, which differs from
+            url when it came from a mirror
+        bytes: The number of bytes transferred over the network
+        seconds: The wall time taken for the file, including waiting for
+            locks held by other processes
+        retries: The number of requests that failed and were retried
+        stalls: The number of transfers that were aborted for being slower
+            than the minimum throughput
+        error: The error of a file that failed
+    """
+
+    def __init__(self, url: str, local_file: str):
+        self.url = url
+        self.local_file = local_file
+        self.status = None
+        self.source_url = None
+        self.bytes = 0
+        self.seconds = 0.0
+        self.retries = 0
+        self.stalls = 0
+        self.error = None
+        # segments of a file are downloaded by several threads at once
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (
+            f"FileMetrics({self.local_file!r}, status={self.status!r}, "
+            f"bytes={self.bytes}, seconds={self.seconds:.3f})"
+        )
+
+    def add_bytes(self, count: int) -> None:
+        with self._lock:
+            self.bytes += count
+
+    def add_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def add_stall(self) -> None:
+        with self._lock:
+            self.stalls += 1
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """The bytes transferred per second or None if nothing was transferred"""
+
+        if not self.bytes or not self.seconds:
+            return None
+        return self.bytes / self.seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "local_file": self.local_file,
+            "status": self.status,
+            "source_url": self.source_url,
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "throughput": self.throughput,
+            "retries": self.retries,
+            "stalls": self.stalls,
+            "error": self.error,
+        }
+
+
+class DownloadReport:
+    """The metrics of every file in one or more batches of downloads and
+    the totals of the batches. Pass a DownloadReport to
+    download_data_frame_of, or to download_cross_section_data, and it is
+    filled in as the files finish.
+
+    Attributes:
+        files: The FileMetrics of each file in the order of the batch
+        seconds: The wall time of the batches
+        connections_opened: The number of new connections opened
+        connections_reused: The number of requests sent on an open connection
+    """
+
+    def __init__(self):
+        self.files: List[FileMetrics] = []
+        self.seconds = 0.0
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    def __repr__(self):
+        return f"DownloadReport(files={len(self.files)}, seconds={self.seconds:.3f})"
+
+    def summary(self) -> dict:
+        """The totals of the report, the number of files with each status,
+        the bytes transferred, the throughput of the batches and percentiles
+        of the time and throughput of the downloaded files"""
+
+        downloaded = [
+            metrics for metrics in self.files if metrics.status == "downloaded"
+        ]
+        total_bytes = sum(metrics.bytes for metrics in self.files)
+        seconds = sorted(metrics.seconds for metrics in downloaded)
+        throughputs = sorted(
+            metrics.throughput
+            for metrics in downloaded
+            if metrics.throughput is not None
+        )
+
+        return {
+            "files": len(self.files),
+            **{
+                status: sum(metrics.status == status for metrics in self.files)
+                for status in STATUSES
+            },
+            "bytes": total_bytes,
+            "seconds": self.seconds,
+            "throughput": total_bytes / self.seconds if self.seconds else None,
+            "retries": sum(metrics.retries for metrics in self.files),
+            "stalls": sum(metrics.stalls for metrics in self.files),
+            "connections_opened": self.connections_opened,
+            "connections_reused": self.connections_reused,
+            "file_seconds": _percentiles(seconds),
+            "file_throughput": _percentiles(throughputs),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "summary": self.summary(),
+            "files": [metrics.to_dict() for metrics in self.files],
+        }
+
+    def write_json(self, path: Union[str, Path]) -> Path:
+        """Writes the summary and the metrics of every file to a json file"""
+
+        path = Path(path)
+        _write_text_atomically(path, json.dumps(self.to_dict(), indent=2) + "\n")
+        return path
+
+
+def _percentiles(values: List[float]) -> dict:
+    """The percentiles and maximum of sorted values, interpolating linearly
+    between the nearest values"""
+
+    result = {}
+    if not values:
+        for percentile in _PERCENTILES:
+            result[f"p{percentile}"] = None
+        result["max"] = None
+        return result
+
+    for percentile in _PERCENTILES:
+        position = (len(values) - 1) * percentile / 100
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        result[f"p{percentile}"] = values[lower] + (values[upper] - values[lower]) * (
+            position - lower
+        )
+    result["max"] = values[-1]
+    return result
@@ -0,0 +1,196 @@
+"""
+Retrying requests that fail for reasons that are likely to pass, such as
+rate limiting, server errors, dropped connections and timeouts. Failed
+requests are retried after an exponentially growing delay with full jitter,
+so many clients that failed together do not retry together, and a
+Retry-After header sent by the server is honoured. Permanent errors such as
+404 Not Found are raised straight away. Transfers that slow to below a
+minimum throughput are aborted and retried in the same way.
+"""
+
+import email.utils
+import errno
+import logging
+import random
+import socket
+import ssl
+import time
+from http.client import HTTPException
+from typing import Callable, Optional
+from urllib.error import HTTPError, URLError
+
+_logger = logging.getLogger(__name__)
+
+# HTTP status codes that are worth retrying, 429 is sent when rate limited
+TRANSIENT_STATUS_CODES = (408, 425, 429, 500, 502, 503, 504)
+
+_PERMANENT_OS_ERRORS = (
+    FileNotFoundError,
+    IsADirectoryError,
+    NotADirectoryError,
+    PermissionError,
+)
+
+# TLS errors from a connection that was dropped, other TLS errors such as a
+# certificate that fails verification are not retried
+_TRANSIENT_SSL_ERRORS = (ssl.SSLEOFError, ssl.SSLZeroReturnError)
+
+# socket errors of unreachable networks and hosts that are raised as they are
+# by the connection pool rather than wrapped in a URLError as urllib does
+_TRANSIENT_ERRNOS = {
+    getattr(errno, name)
+    for name in ("ENETUNREACH", "ENETDOWN", "EHOSTUNREACH", "EHOSTDOWN", "ETIMEDOUT")
+    if hasattr(errno, name)
+}
+
+
+class StalledDownloadError(TimeoutError):
+    """Raised when a transfer is slower than the minimum throughput"""
+
+
+class RetryPolicy:
+    """How requests are timed out and retried
+
+    Arguments:
+        tries: The maximum number of attempts at each request
+        timeout: The number of seconds to wait for a connection and for each
+            read before the attempt fails. If None the default socket
+            timeout is used
+        backoff: The delay in seconds before the first retry, the delay is
+            doubled for each further retry
+        max_delay: The longest delay between two attempts
+        max_retry_after: The longest delay requested with Retry-After that
+            is waited for, longer requests are shortened to this
+        jitter: If True each delay is a random time up to the backoff delay
+            so that clients that failed at the same time spread out
+        min_throughput: The slowest transfer in bytes per second that is
+            accepted. A transfer that is slower than this over stall_window
+            seconds is aborted with StalledDownloadError and retried from
+            where it stopped. If None transfers are never aborted for being
+            slow, although the timeout still applies to each read
+        stall_window: The number of seconds the throughput is measured over
+    """
+
+    def __init__(
+        self,
+        tries: int = 5,
+        timeout: Optional[float] = 60,
+        backoff: float = 1,
+        max_delay: float = 60,
+        max_retry_after: float = 300,
+        jitter: bool = True,
+        min_throughput: Optional[float] = None,
+        stall_window: float = 30,
+    ):
+        if tries < 1:
+            raise ValueError(f"tries must be 1 or more. Not {tries}")
+        if stall_window <= 0:
+            raise ValueError(f"stall_window must be more than 0. Not {stall_window}")
+
+        self.tries = tries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.jitter = jitter
+        self.min_throughput = min_throughput
+        self.stall_window = stall_window
+
+    def __repr__(self):
+        return (
+            f"RetryPolicy(tries={self.tries}, timeout={self.timeout}, "
+            f"backoff={self.backoff})"
+        )
+
+    def call(self, function: Callable, *args, on_retry: Callable = None, **kwargs):
+        """Calls the function until it returns, raises an error that is not
+        transient or has been tried tries times
+
+        Arguments:
+            function: The request to make
+            args: Positional arguments passed to the function
+            on_retry: Called with the error before each retry
+            kwargs: Keyword arguments passed to the function
+
+        Returns
+            The result of the function
+        """
+
+        for attempt in range(1, self.tries + 1):
+            try:
+                return function(*args, **kwargs)
+            except Exception as error:
+                if attempt == self.tries or not is_transient(error):
+                    raise
+                delay = self.delay(attempt, error)
+                _logger.warning(
+                    "Attempt %d of %d failed, %s, retrying in %.1fs",
+                    attempt,
+                    self.tries,
+                    error,
+                    delay,
+                )
+                if on_retry is not None:
+                    on_retry(error)
+                time.sleep(delay)
+
+    def delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """The number of seconds to wait after the attempt failed with error"""
+
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+
+        delay = min(self.max_delay, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+
+def is_transient(error: Exception) -> bool:
+    """True if the request that raised the error may succeed when retried"""
+
+    if isinstance(error, HTTPError):
+        return error.code in TRANSIENT_STATUS_CODES
+    if isinstance(error, URLError):
+        # refused connections, timeouts and failed lookups but not missing
+        # local files, unknown url types or failed certificates
+        error = error.reason
+        if not isinstance(error, OSError):
+            return False
+        if isinstance(error, ssl.SSLError):
+            return isinstance(error, _TRANSIENT_SSL_ERRORS)
+        return not isinstance(error, _PERMANENT_OS_ERRORS)
+    if isinstance(error, ssl.SSLError):
+        return isinstance(error, _TRANSIENT_SSL_ERRORS)
+    # failed lookups, which include temporary DNS failures, and unreachable
+    # networks are treated in the same way as when wrapped in a URLError
+    if isinstance(error, socket.gaierror):
+        return True
+    if isinstance(error, OSError) and error.errno in _TRANSIENT_ERRNOS:
+        return True
+    # dropped connections, incomplete reads, timeouts and stalled transfers
+    return isinstance(
+        error, (HTTPException, ConnectionError, TimeoutError, socket.timeout)
+    )
+
+
+def _retry_after(error: Optional[Exception]) -> Optional[float]:
+    """The delay requested by the Retry-After header of the error, which is
+    either a number of seconds or a date"""
+
+    headers = getattr(error, "headers", None)
+    if not isinstance(error, HTTPError) or headers is None:
+        return None
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
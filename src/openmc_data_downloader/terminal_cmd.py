@@ -9,14 +9,55 @@ generation of custom cross_section.xml files
 """
 
 import argparse
+import json
+import logging
+import os
+import sys
 from pathlib import Path
 import openmc_data_downloader
 from openmc_data_downloader.cross_sections_directory import (
     lib_to_xml,
     NATURAL_ABUNDANCE,
-    SAB_OPTIONS,
 )
-import openmc
+from openmc_data_downloader.cache import CACHE_ENVIRONMENTAL_VARIABLE, DownloadCache
+from openmc_data_downloader.locks import STALE_LOCK_TIMEOUT
+from openmc_data_downloader.mirrors import parse_mirrors
+from openmc_data_downloader.retries import RetryPolicy
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats each log record as one line of json"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def configure_logging(level: int = logging.INFO, log_format: str = "text") -> None:
+    """Shows the messages of the package on stdout
+
+    Arguments:
+        level: The lowest level of message to show
+        log_format: "text" for the plain messages or "json" for one json
+            object per line
+    """
+
+    handler = logging.StreamHandler(sys.stdout)
+    if log_format == "json":
+        handler.setFormatter(JsonLinesFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(message)s"))
+
+    logger = logging.getLogger("openmc_data_downloader")
+    logger.addHandler(handler)
+    logger.setLevel(level)
 
 
 def main():
@@ -29,9 +70,9 @@ def main():
         nargs="*",
         help="The nuclear data libraries to search through when searching for \
         cross sections. Multiple libaries are acceptable and will be \
-        preferentially utilized in the order provided",
+        preferentially utilized in the order provided. Required unless \
+        --sync is used",
         default=[],
-        required=True,
     )
     parser.add_argument(
         "-i",
@@ -47,7 +88,7 @@ def main():
         nargs="*",
         default=[],
         help="The SaB cross sections to download. Options include "
-        + " ".join(SAB_OPTIONS),
+        + " ".join(openmc_data_downloader.SAB_OPTIONS),
     )
 
     parser.add_argument(
@@ -91,9 +132,277 @@ def main():
         help="Exiting files will not be overwritten",
     )
 
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=4,
+        help="The maximum number of files to download at the same time",
+    )
+
+    parser.add_argument(
+        "--segment_threshold",
+        type=int,
+        default=None,
+        help="Files of at least this many bytes are downloaded as several \
+        byte ranges at the same time. By default files are not split",
+    )
+
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=4,
+        help="The number of byte ranges large files are split into",
+    )
+
+    parser.add_argument(
+        "--buffer_size",
+        type=int,
+        default=1024 * 1024,
+        help="The size in bytes of the buffer downloads are read into",
+    )
+
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=None,
+        help="Directory of a download cache shared between destinations. \
+        Defaults to the OPENMC_DATA_DOWNLOADER_CACHE environmental variable",
+    )
+
+    parser.add_argument(
+        "--link_mode",
+        choices=["auto", "hardlink", "reflink", "symlink", "copy"],
+        default="auto",
+        help="How files are placed in the destination from the cache",
+    )
+
+    parser.add_argument(
+        "--lock_mode",
+        choices=["auto", "fcntl", "exclusive", "none"],
+        default="auto",
+        help="How each file is locked while it is downloaded so that jobs \
+        sharing the destination do not download the same file",
+    )
+
+    parser.add_argument(
+        "--lock_timeout",
+        type=float,
+        default=None,
+        help="The number of seconds to wait for another job to finish \
+        downloading a file. By default it is waited for indefinitely",
+    )
+
+    parser.add_argument(
+        "--stale_lock_timeout",
+        type=float,
+        default=STALE_LOCK_TIMEOUT,
+        help="The number of seconds after which a lock file left behind by a \
+        job that died is taken over. Keep this well above the time NFS \
+        clients cache file attributes for",
+    )
+
+    parser.add_argument(
+        "--partition",
+        type=int,
+        nargs=2,
+        metavar=("INDEX", "COUNT"),
+        default=None,
+        help="The index of this job and the number of jobs downloading the \
+        same files to the destination. The jobs share the downloads and job \
+        0 writes the cross_sections.xml file",
+    )
+
+    parser.add_argument(
+        "--from_catalog",
+        action="store_true",
+        help="Write the cross_sections.xml file from the catalog of each \
+        library instead of opening every downloaded file",
+    )
+
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check that the downloaded files contain the materials and type \
+        written to the cross_sections.xml file",
+    )
+
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="Add the files to an existing cross_sections.xml file in the \
+        destination instead of replacing it",
+    )
+
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        default=None,
+        help="Write a manifest of the downloaded files with the size and \
+        checksum of each file to this path",
+    )
+
+    parser.add_argument(
+        "--sync",
+        type=Path,
+        default=None,
+        help="Make the destination match this manifest, downloading missing \
+        files and removing files that are not listed. The destination \
+        defaults to the folder of the manifest",
+    )
+
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60,
+        help="The number of seconds to wait for a connection and for each \
+        read before the request is retried",
+    )
+
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=5,
+        help="The maximum number of attempts at each request. Rate limiting, \
+        server errors, dropped connections and timeouts are retried with an \
+        exponential backoff, other errors such as 404 are not",
+    )
+
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=1,
+        help="The delay in seconds before the first retry, doubled for each \
+        further retry and randomised so that jobs do not retry together",
+    )
+
+    parser.add_argument(
+        "--min_throughput",
+        type=float,
+        default=None,
+        help="The slowest download in bytes per second that is accepted, \
+        slower downloads are aborted and retried from where they stopped",
+    )
+
+    parser.add_argument(
+        "--stall_window",
+        type=float,
+        default=30,
+        help="The number of seconds the throughput of a download is measured \
+        over when checking it against --min_throughput",
+    )
+
+    parser.add_argument(
+        "--report",
+        type=Path,
+        default=None,
+        help="Write the bytes, time, throughput and retries of each file and \
+        the totals of the downloads to this json file",
+    )
+
+    parser.add_argument(
+        "--pack",
+        type=Path,
+        default=None,
+        help="Pack the files into this archive, with a manifest, to copy to \
+        a machine without network access. The files are downloaded to the \
+        destination or to a temporary folder if no destination is given",
+    )
+
+    parser.add_argument(
+        "--unpack",
+        type=Path,
+        default=None,
+        help="Extract an archive made with --pack into the destination and \
+        write the cross_sections.xml file without any network access",
+    )
+
+    parser.add_argument(
+        "--mirror",
+        action="append",
+        default=None,
+        help="Mirrors of the libraries to download from in the format \
+        LIBRARY=URL,URL, for example TENDL-2019=https://mirror.example.com/tendl/. \
+        Mirrors without a library are used for every library. Can be repeated",
+    )
+
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="Only show warnings and errors",
+    )
+
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Also show debugging messages such as the files found",
+    )
+
+    parser.add_argument(
+        "--log_format",
+        choices=["text", "json"],
+        default="text",
+        help="Show messages as plain text or as one json object per line",
+    )
+
     parser.set_defaults(overwrite=False)
     args = parser.parse_args()
 
+    if args.quiet:
+        configure_logging(logging.WARNING, args.log_format)
+    elif args.verbose:
+        configure_logging(logging.DEBUG, args.log_format)
+    else:
+        configure_logging(logging.INFO, args.log_format)
+
+    if args.unpack is not None:
+        openmc_data_downloader.unpack_cross_section_data(
+            args.unpack, destination=args.destination
+        )
+        return
+
+    if args.sync is None and not args.libraries:
+        parser.error("the following arguments are required: -l/--libraries")
+
+    if args.cache is not None or os.environ.get(CACHE_ENVIRONMENTAL_VARIABLE):
+        cache = DownloadCache(args.cache, link_mode=args.link_mode)
+    else:
+        cache = None
+
+    download_options = {
+        "segment_threshold": args.segment_threshold,
+        "segments": args.segments,
+        "buffer_size": args.buffer_size,
+        "cache": cache,
+        "lock_mode": None if args.lock_mode == "none" else args.lock_mode,
+        "lock_timeout": args.lock_timeout,
+        "stale_lock_timeout": args.stale_lock_timeout,
+        "report_file": args.report,
+        "retry_policy": RetryPolicy(
+            tries=args.retries,
+            timeout=args.timeout,
+            backoff=args.backoff,
+            min_throughput=args.min_throughput,
+            stall_window=args.stall_window,
+        ),
+        "mirrors": (
+            None if args.mirror is None else parse_mirrors(";".join(args.mirror))
+        ),
+    }
+
+    if args.sync is not None:
+        openmc_data_downloader.sync_manifest(
+            args.sync,
+            destination=args.destination,
+            max_workers=args.max_workers,
+            **download_options,
+        )
+        return
+
+    # imported after the arguments are parsed so --help does not wait for it
+    import openmc
+
     if args.elements == ["all"]:
         args.elements = openmc_data_downloader.ALL_ELEMENT_OPTIONS
     if args.elements == ["stable"]:
@@ -124,12 +433,30 @@ def main():
             mats_from_xml = openmc.Materials.from_xml(material_xml)
             mats = mats + mats_from_xml
 
+    if args.pack is not None:
+        mats.pack_cross_section_data(
+            args.pack,
+            libraries=args.libraries,
+            particles=args.particles,
+            destination=args.destination,
+            max_workers=args.max_workers,
+            **download_options,
+        )
+        return
+
     mats.download_cross_section_data(
         libraries=args.libraries,
         destination=args.destination,
         particles=args.particles,
         set_OPENMC_CROSS_SECTIONS=False,
         overwrite=args.overwrite,
+        max_workers=args.max_workers,
+        from_catalog=args.from_catalog,
+        verify=args.verify,
+        merge=args.merge,
+        manifest=args.manifest,
+        partition=args.partition,
+        **download_options,
     )
 
 
@@ -1,30 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import importlib.abc
+import importlib.util
+import logging
+import multiprocessing
 import os
+import re
+import sys
+import tempfile
+import threading
+import time
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from http.client import HTTPException, IncompleteRead
 from pathlib import Path
 import typing
+import uuid
 from typing import List, Optional, Union
 from urllib.parse import urlparse
-from urllib.request import urlopen
 from urllib.error import HTTPError
-import pandas as pd
-from retry import retry
-import openmc
 
 
-from openmc_data_downloader import (
-    ALL_ISOTOPE_OPTIONS,
+from openmc_data_downloader import cross_sections_directory
+from openmc_data_downloader.cross_sections_directory import (
     STABLE_ISOTOPE_OPTIONS,
-    ALL_ELEMENT_OPTIONS,
-    STABLE_ELEMENT_OPTIONS,
-    LIB_OPTIONS,
     PARTICLE_OPTIONS,
-    neutron_xs_info,
-    photon_xs_info,
-    sab_xs_info,
-    SAB_OPTIONS,
 )
+from openmc_data_downloader.cache import (
+    CACHE_ENVIRONMENTAL_VARIABLE,
+    DownloadCache,
+    file_sha256,
+)
+from openmc_data_downloader.bundle import extract_bundle, write_bundle
+from openmc_data_downloader.catalog import PARTICLE_TO_XML_TYPE
+from openmc_data_downloader.connection_pool import ConnectionPool
+from openmc_data_downloader.locks import (
+    STALE_LOCK_TIMEOUT,
+    FileLock,
+    LockTimeout,
+    lock_path_for,
+)
+from openmc_data_downloader.manifest import diff_manifest, read_manifest, write_manifest
+from openmc_data_downloader.mirrors import (
+    configured_mirrors,
+    library_mirrors,
+    mirror_url,
+    rank_mirrors,
+)
+from openmc_data_downloader.report import DownloadReport, FileMetrics
+from openmc_data_downloader.retries import RetryPolicy, StalledDownloadError
 
-_BLOCK_SIZE = 16384
+if typing.TYPE_CHECKING:
+    # openmc and pandas take seconds to import on some file systems so they
+    # are only imported inside the functions that use them
+    import openmc
+    import pandas as pd
+
+_logger = logging.getLogger(__name__)
+
+_BUFFER_SIZE = 1024 * 1024
+_MAX_WORKERS = 4
+_SEGMENTS = 4
 
 
 def set_environmental_variable(cross_section_xml_path: Union[Path, str]) -> None:
@@ -37,12 +76,25 @@ def set_environmental_variable(cross_section_xml_path: Union[Path, str]) -> None
             "OPENMC_CROSS_SECTIONS environmental variable"
         )
 
-    print(f"setting OPENMC_CROSS_SECTIONS to {str(cross_section_xml_path)}")
+    _logger.info("setting OPENMC_CROSS_SECTIONS to %s", cross_section_xml_path)
     os.environ["OPENMC_CROSS_SECTIONS"] = str(cross_section_xml_path)
     # openmc.config['cross_sections'] = cross_section_xml_path
 
 
-def expand_materials_to_isotopes(materials: openmc.Materials):
+def expand_materials(
+    materials: openmc.Materials,
+) -> typing.Tuple[typing.Set[str], typing.Set[str], typing.Set[str]]:
+    """Finds the nuclides, elements and S(a,b) tables used by the materials
+    in a single pass over the materials
+
+    Arguments:
+        materials: The materials to look through
+
+    Returns
+        The sets of nuclide names, element symbols and S(a,b) table names
+    """
+    import openmc
+
     if not isinstance(materials, openmc.Materials):
         raise ValueError("materials argument must be an openmc.Materials() object")
     if len(materials) == 0:
@@ -50,47 +102,64 @@ def expand_materials_to_isotopes(materials: openmc.Materials):
             "There are no openmc.Material() entries within the openmc.Materials() object"
         )
 
-    isotopes_from_materials = []
+    isotopes, sabs = set(), set()
     for material in materials:
-        for nuc in material.nuclides:
-            isotopes_from_materials.append(nuc.name)
+        isotopes.update(nuc.name for nuc in material.nuclides)
+        sabs.update(sab[0] for sab in material._sab)
 
-    return sorted(list(set(isotopes_from_materials)))
+    # the elements are found from the distinct nuclides, in the same way as
+    # Material.get_elements, rather than from every nuclide of every material
+    elements = {re.split(r"(\d+)", isotope, maxsplit=1)[0] for isotope in isotopes}
 
+    return isotopes, elements, sabs
 
-def expand_materials_to_sabs(materials: openmc.Materials):
-    if not isinstance(materials, openmc.Materials):
-        raise ValueError("materials argument must be an openmc.Materials() object")
-    if len(materials) == 0:
-        raise ValueError(
-            "There are no openmc.Material() entries within the openmc.Materials() object"
-        )
 
-    sabs_from_materials = []
-    for material in materials:
-        for sab in material._sab:
-            sabs_from_materials.append(sab[0])
+def expand_materials_to_isotopes(materials: openmc.Materials):
+    isotopes, _, _ = expand_materials(materials)
+    return sorted(isotopes)
 
-    return sorted(list(set(sabs_from_materials)))
+
+def expand_materials_to_sabs(materials: openmc.Materials):
+    _, _, sabs = expand_materials(materials)
+    return sorted(sabs)
 
 
 def expand_materials_to_elements(materials: openmc.Materials):
-    if not isinstance(materials, openmc.Materials):
-        raise ValueError("materials argument must be an openmc.Materials() object")
-    if len(materials) == 0:
-        raise ValueError(
-            "There are no openmc.Material() entries within the openmc.Materials() object"
-        )
+    _, elements, _ = expand_materials(materials)
+    return sorted(elements)
 
-    elements_from_materials = []
-    for material in materials:
-        elements = material.get_elements()
-        elements_from_materials = elements_from_materials + elements
 
-    return list(set(elements_from_materials))
+def identify_materials_to_download(
+    materials: openmc.Materials,
+    libraries: typing.Iterable[str],
+    particles: typing.Iterable[str],
+) -> pd.DataFrame:
+    """Finds the cross section files needed for the nuclides, elements and
+    S(a,b) tables in the materials, taking each from the highest priority
+    library that contains it"""
+
+    for entry in particles:
+        if entry not in PARTICLE_OPTIONS:
+            raise ValueError(
+                f"The particle must be one of the following {PARTICLE_OPTIONS}. Not {entry}"
+            )
+
+    isotopes, elements, sabs = expand_materials(materials)
 
+    dataframe = identify_to_download(
+        libraries=libraries,
+        isotopes=sorted(isotopes) if "neutron" in particles else [],
+        elements=sorted(elements) if "photon" in particles else [],
+        sabs=sorted(sabs),
+    )
 
-def download_cross_section_data(
+    # formatting the whole plan is slow so it is only done when it is shown
+    _logger.debug("Files to download\n%s", dataframe)
+
+    return dataframe
+
+
+async def download_cross_section_data_async(
     self,
     libraries: typing.Iterable[str] = (
         "TENDL-2019",
@@ -102,50 +171,92 @@ def download_cross_section_data(
     particles: Optional[typing.Iterable[str]] = ("neutron", "photon"),
     set_OPENMC_CROSS_SECTIONS: bool = True,
     overwrite: bool = False,
+    max_workers: int = _MAX_WORKERS,
+    from_catalog: bool = False,
+    verify: bool = False,
+    merge: bool = False,
+    manifest: Union[str, Path, None] = None,
+    partition: Optional[typing.Tuple[int, int]] = None,
+    **kwargs,
 ) -> str:
-    """ """
-
-    for entry in particles:
-        if entry not in PARTICLE_OPTIONS:
-            raise ValueError(
-                f"The particle must be one of the following {PARTICLE_OPTIONS}. Not {entry}"
-            )
+    """Awaitable version of download_cross_section_data. The resolution of
+    files and the writing of the cross_sections.xml are run in the default
+    executor and the files are downloaded with download_data_frame_of_async
+    so the running event loop is not blocked. from_catalog, verify and merge
+    are passed to create_cross_sections_xml and additional keyword arguments
+    are passed to download_single_file. If manifest is given a manifest of
+    the downloaded files is written to that path, see sync_manifest.
+
+    When several processes download the same materials to one destination
+    each can pass its (index, count) as partition to share the downloads,
+    see download_data_frame_cooperatively. The process with index 0 writes
+    the cross_sections.xml and manifest files and the others wait for it.
+    overwrite can not be used with partition as a file downloaded by one
+    process would be downloaded again by the others."""
+
+    if partition is not None and overwrite:
+        raise ValueError(
+            "overwrite can not be used with partition, remove the files from "
+            "the destination before sharing the downloads instead"
+        )
 
-    dataframe = pd.DataFrame()
+    loop = asyncio.get_running_loop()
 
-    if "neutron" in particles:
-        isotopes = expand_materials_to_isotopes(self)
-        # filters the large dataframe of all isotopes into just the ones you want
-        dataframe_isotopes_xs = identify_isotopes_to_download(
-            libraries=libraries,
-            isotopes=isotopes,
-        )
-        dataframe = pd.concat([dataframe, dataframe_isotopes_xs])
+    dataframe = await loop.run_in_executor(
+        None, identify_materials_to_download, self, libraries, particles
+    )
 
-    if "photon" in particles:
-        elements = expand_materials_to_elements(self)
-        dataframe_elements_xs = identify_elements_to_download(
-            libraries=libraries,
-            elements=elements,
+    if partition is None:
+        await download_data_frame_of_async(
+            dataframe=dataframe,
+            destination=destination,
+            overwrite=overwrite,
+            max_workers=max_workers,
+            **kwargs,
         )
-        dataframe = pd.concat([dataframe, dataframe_elements_xs])
-
-    sabs = expand_materials_to_sabs(self)
-    if len(sabs) > 0:
-        dataframe_sabs_xs = identify_sabs_to_download(
-            libraries=libraries,
-            sabs=sabs,
+    else:
+        await download_data_frame_cooperatively_async(
+            dataframe=dataframe,
+            destination=destination,
+            partition=partition,
+            max_workers=max_workers,
+            **kwargs,
         )
-        dataframe = pd.concat([dataframe, dataframe_sabs_xs])
-        print("dataframe_sabs_xs", dataframe_sabs_xs)
 
-    print(dataframe)
+    # only one of the processes sharing the destination writes the files
+    is_writer = partition is None or partition[0] == 0
 
-    download_data_frame_of(
-        dataframe=dataframe, destination=destination, overwrite=overwrite
-    )
+    if not is_writer:
+        cross_section_xml_path = await loop.run_in_executor(
+            None,
+            _wait_for_cross_sections_xml,
+            dataframe,
+            destination,
+            kwargs.get("lock_timeout"),
+        )
+    else:
+        cross_section_xml_path = await loop.run_in_executor(
+            None,
+            functools.partial(
+                create_cross_sections_xml,
+                dataframe,
+                destination,
+                from_catalog=from_catalog,
+                verify=verify,
+                max_workers=max_workers,
+                merge=merge,
+            ),
+        )
 
-    cross_section_xml_path = create_cross_sections_xml(dataframe, destination)
+    if manifest is not None and is_writer:
+        await loop.run_in_executor(
+            None,
+            write_manifest,
+            dataframe.to_dict("records"),
+            destination,
+            manifest,
+            max_workers,
+        )
 
     if set_OPENMC_CROSS_SECTIONS is True:
         self.cross_sections = cross_section_xml_path
@@ -154,25 +265,343 @@ def download_cross_section_data(
         if cross_section_xml_path is not None:
             set_environmental_variable(cross_section_xml_path)
     else:
-        print(
+        _logger.info(
             "Set your $OPENMC_CROSS_SECTIONS environmental variable to "
-            f"{cross_section_xml_path} to use this custom library"
+            "%s to use this custom library",
+            cross_section_xml_path,
         )
 
     return cross_section_xml_path
 
 
+def download_cross_section_data(
+    self,
+    libraries: typing.Iterable[str] = (
+        "TENDL-2019",
+        "ENDFB-7.1-NNDC",
+        "ENDFB-8.0-NNDC",
+        "FENDL-3.1d",
+    ),
+    destination: Union[str, Path] = None,
+    particles: Optional[typing.Iterable[str]] = ("neutron", "photon"),
+    set_OPENMC_CROSS_SECTIONS: bool = True,
+    overwrite: bool = False,
+    max_workers: int = _MAX_WORKERS,
+    from_catalog: bool = False,
+    verify: bool = False,
+    merge: bool = False,
+    manifest: Union[str, Path, None] = None,
+    partition: Optional[typing.Tuple[int, int]] = None,
+    **kwargs,
+) -> str:
+    """ """
+
+    return _run_coroutine(
+        download_cross_section_data_async(
+            self,
+            libraries=libraries,
+            destination=destination,
+            particles=particles,
+            set_OPENMC_CROSS_SECTIONS=set_OPENMC_CROSS_SECTIONS,
+            overwrite=overwrite,
+            max_workers=max_workers,
+            from_catalog=from_catalog,
+            verify=verify,
+            merge=merge,
+            manifest=manifest,
+            partition=partition,
+            **kwargs,
+        )
+    )
+
+
+def sync_manifest(
+    manifest: Union[str, Path],
+    destination: Union[str, Path] = None,
+    remove: bool = True,
+    max_workers: int = _MAX_WORKERS,
+    **kwargs,
+) -> str:
+    """Makes the files in the destination match a manifest written by
+    download_cross_section_data. Files that are missing or the wrong size
+    are downloaded and checked against their checksum, and downloaded files
+    that are not in the manifest are removed. The destination is compared
+    with the manifest by file size alone so syncing a destination that
+    already matches reads no files and makes no network requests.
+
+    Arguments:
+        manifest: The manifest file to sync with
+        destination: The folder to sync, defaults to the folder of the
+            manifest
+        remove: If False files that are not in the manifest are kept
+        max_workers: The maximum number of files downloaded at the same time
+        kwargs: Additional keyword arguments passed to download_single_file
+
+    Returns
+        The absolute path of the cross_sections.xml file
+    """
+
+    if destination is None:
+        destination = Path(manifest).parent
+    destination = Path(destination)
+    cross_sections_xml_path = destination / "cross_sections.xml"
+
+    entries = read_manifest(manifest)
+    missing, unlisted = diff_manifest(entries, destination)
+
+    if remove:
+        for path in unlisted:
+            _logger.info("Removing %s, not in the manifest", path)
+            path.unlink()
+    else:
+        unlisted = []
+
+    if not missing and not unlisted and cross_sections_xml_path.is_file():
+        _logger.info("%s is in sync with %s", destination, manifest)
+        return str(cross_sections_xml_path.absolute())
+
+    import pandas as pd
+
+    if missing:
+        local_files = download_data_frame_of(
+            dataframe=pd.DataFrame.from_records(missing),
+            destination=destination,
+            overwrite=True,
+            max_workers=max_workers,
+            **kwargs,
+        )
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            checksums = list(executor.map(file_sha256, local_files))
+        mismatches = [
+            str(local_file)
+            for local_file, entry, checksum in zip(local_files, missing, checksums)
+            if checksum != entry["sha256"]
+        ]
+        if mismatches:
+            raise RuntimeError(
+                f"{len(mismatches)} of {len(missing)} downloaded files do not "
+                "match the checksum in the manifest\n" + "\n".join(mismatches)
+            )
+
+    return create_cross_sections_xml(
+        pd.DataFrame.from_records(entries), destination, from_catalog=True
+    )
+
+
+async def pack_cross_section_data_async(
+    self,
+    archive: Union[str, Path],
+    libraries: typing.Iterable[str] = (
+        "TENDL-2019",
+        "ENDFB-7.1-NNDC",
+        "ENDFB-8.0-NNDC",
+        "FENDL-3.1d",
+    ),
+    particles: Optional[typing.Iterable[str]] = ("neutron", "photon"),
+    destination: Union[str, Path, None] = None,
+    max_workers: int = _MAX_WORKERS,
+    **kwargs,
+) -> Path:
+    """Awaitable version of pack_cross_section_data"""
+
+    loop = asyncio.get_running_loop()
+
+    dataframe = await loop.run_in_executor(
+        None, identify_materials_to_download, self, libraries, particles
+    )
+
+    # without a destination the files are only kept until they are packed
+    with (
+        tempfile.TemporaryDirectory()
+        if destination is None
+        else nullcontext(destination)
+    ) as destination:
+        await download_data_frame_of_async(
+            dataframe=dataframe,
+            destination=destination,
+            overwrite=False,
+            max_workers=max_workers,
+            **kwargs,
+        )
+        return await loop.run_in_executor(
+            None,
+            write_bundle,
+            dataframe.to_dict("records"),
+            destination,
+            archive,
+            max_workers,
+        )
+
+
+def pack_cross_section_data(
+    self,
+    archive: Union[str, Path],
+    libraries: typing.Iterable[str] = (
+        "TENDL-2019",
+        "ENDFB-7.1-NNDC",
+        "ENDFB-8.0-NNDC",
+        "FENDL-3.1d",
+    ),
+    particles: Optional[typing.Iterable[str]] = ("neutron", "photon"),
+    destination: Union[str, Path, None] = None,
+    max_workers: int = _MAX_WORKERS,
+    **kwargs,
+) -> Path:
+    """Downloads the cross sections needed for the materials, in the same
+    way as download_cross_section_data, and packs them into a bundle that
+    can be copied to a machine without network access and unpacked there
+    with unpack_cross_section_data.
+
+    Arguments:
+        archive: The bundle to write, a tar archive that is compressed if
+            it ends in .gz, .tgz, .bz2 or .xz
+        libraries: The libraries to take the files from in order of priority
+        particles: The particles to download the cross sections of
+        destination: A folder to download the files to and keep them in. If
+            None they are downloaded to a temporary folder
+        max_workers: The maximum number of files downloaded at the same time
+        kwargs: Additional keyword arguments passed to download_single_file
+
+    Returns
+        The path of the bundle
+    """
+
+    return _run_coroutine(
+        pack_cross_section_data_async(
+            self,
+            archive=archive,
+            libraries=libraries,
+            particles=particles,
+            destination=destination,
+            max_workers=max_workers,
+            **kwargs,
+        )
+    )
+
+
+def unpack_cross_section_data(
+    archive: Union[str, Path], destination: Union[str, Path] = None
+) -> str:
+    """Extracts a bundle written by pack_cross_section_data and writes the
+    cross_sections.xml file for it. No network access is needed and the
+    cross_sections.xml file is written from the manifest of the bundle
+    without opening the extracted files.
+
+    Arguments:
+        archive: The bundle to extract
+        destination: The folder to extract the files to
+
+    Returns
+        The absolute path of the cross_sections.xml file
+    """
+
+    entries = extract_bundle(archive, destination)
+
+    import pandas as pd
+
+    return create_cross_sections_xml(
+        pd.DataFrame.from_records(entries), destination, from_catalog=True
+    )
+
+
+def _wait_for_cross_sections_xml(
+    dataframe: pd.DataFrame,
+    destination: Union[str, Path],
+    timeout: Optional[float] = None,
+) -> str:
+    """Waits for another process to write a cross_sections.xml file in the
+    destination that lists every file in the dataframe"""
+
+    if destination is None:
+        destination = Path(".")
+    cross_sections_xml_path = Path(destination) / "cross_sections.xml"
+    local_files = set(dataframe["local_file"])
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    while True:
+        try:
+            entries = _read_cross_sections_xml(cross_sections_xml_path)
+        except (FileNotFoundError, ET.ParseError):
+            entries = []
+        if local_files <= {entry["path"] for entry in entries}:
+            return str(cross_sections_xml_path.absolute())
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"Timed out after {timeout}s waiting for {cross_sections_xml_path}"
+            )
+        time.sleep(0.5)
+
+
+def _run_coroutine(coroutine):
+    """Runs the coroutine to completion from synchronous code. When called
+    from a thread that already has a running event loop (e.g. Jupyter) the
+    coroutine is run on its own loop in a separate thread."""
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
 def download_single_file(
     url: str,
     output_filename: Union[str, Path] = None,
     destination: Union[str, Path] = None,
     overwrite: bool = True,
+    pool: Optional[ConnectionPool] = None,
+    segment_threshold: Optional[int] = None,
+    segments: int = _SEGMENTS,
+    buffer_size: int = _BUFFER_SIZE,
+    cache: Union[DownloadCache, bool, None] = None,
+    cache_key: Optional[str] = None,
+    lock_mode: Optional[str] = "auto",
+    lock_timeout: Optional[float] = None,
+    stale_lock_timeout: float = STALE_LOCK_TIMEOUT,
+    fallback_urls: typing.Sequence[str] = (),
+    mirror_urls: Union[
+        typing.Sequence[str], typing.Callable[[], typing.Sequence[str]]
+    ] = (),
+    metrics: Optional[FileMetrics] = None,
+    retry_policy: Optional[RetryPolicy] = None,
 ) -> Path:
     """Download file from a URL
 
     Arguments:
         url: URL from which to download
         destination: Specifies a folder location to save the downloaded file
+        pool: The keep-alive connections to download with, pass the same
+            pool for every file in a batch to reuse connections
+        segment_threshold: Files of at least this many bytes are downloaded
+            as several byte ranges at the same time when the server accepts
+            range requests. If None every file is downloaded as one stream
+        segments: The number of byte ranges large files are split into
+        buffer_size: The size in bytes of the buffer the download is read into
+        cache: The shared cache to fill the file from and to add downloaded
+            files to. If None the cache in the OPENMC_DATA_DOWNLOADER_CACHE
+            environmental variable is used when set, True always uses it and
+            raises ValueError if it is not set, and False disables caching
+        cache_key: The name of the file in the cache, normally
+            "<library>/<remote_file>". Defaults to the host and path of the url
+        lock_mode: How the file is locked while it is downloaded so that
+            other processes sharing the destination wait for it instead of
+            downloading it too, see FileLock. None disables locking
+        lock_timeout: The number of seconds to wait for another process to
+            finish downloading the file. If None it is waited for indefinitely
+        stale_lock_timeout: The number of seconds after which a lock file
+            left behind by a process that died is taken over, see FileLock
+        fallback_urls: Other urls of the same file, e.g. on mirrors, that are
+            tried in order if the download from url fails
+        mirror_urls: Urls of the same file on mirrors that are tried in
+            order before url, or a function returning them that is only
+            called once the file has to be downloaded so mirrors are not
+            contacted for files that are skipped or linked from the cache
+        metrics: The FileMetrics to record how the file was obtained in
+        retry_policy: How requests are timed out and retried, see
+            RetryPolicy. Defaults to 5 tries with a 60 second timeout
 
     Returns
         Name of file written locally
@@ -195,257 +624,1463 @@ def download_single_file(
         Path(destination).mkdir(parents=True, exist_ok=True)
         local_path = destination / local_path
 
+    if metrics is None:
+        metrics = FileMetrics(url, local_path.name)
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+
     if overwrite is False and local_path.is_file():
-        print(f"Skipping {local_path}, already downloaded")
+        _logger.info("Skipping %s, already downloaded", local_path)
+        metrics.status = "skipped"
         return local_path
 
-    local_path = download_url_in_chuncks(url, local_path)
+    if lock_mode is None:
+        lock = nullcontext()
+    else:
+        lock = FileLock(
+            lock_path_for(local_path),
+            timeout=lock_timeout,
+            stale_after=stale_lock_timeout,
+            mode=lock_mode,
+        )
+
+    # only one process downloads the file while any others wait for it
+    with lock as lock:
+        if lock is not None and lock.waited and local_path.is_file():
+            _logger.info("Reusing %s, downloaded by another process", local_path)
+            metrics.status = "reused"
+            return local_path
+
+        if cache is True or (
+            cache is None and os.environ.get(CACHE_ENVIRONMENTAL_VARIABLE)
+        ):
+            cache = DownloadCache()
+        if cache:
+            if cache_key is None:
+                parsed_url = urlparse(url)
+                cache_key = parsed_url.netloc + parsed_url.path
+            if cache.link(cache_key, local_path):
+                _logger.info("Linked %s from the cache", local_path)
+                metrics.status = "cached"
+                return local_path
+
+        # a pool made here is closed again once this single file is downloaded
+        with ConnectionPool() if pool is None else nullcontext(pool) as pool:
+            if callable(mirror_urls):
+                mirror_urls = mirror_urls()
+            urls = [*mirror_urls, url, *fallback_urls]
+            for position, url in enumerate(urls):
+                try:
+                    local_path = _download_url(
+                        url,
+                        local_path,
+                        pool,
+                        segment_threshold,
+                        segments,
+                        buffer_size,
+                        metrics,
+                        retry_policy,
+                    )
+                    break
+                except (OSError, HTTPException) as error:
+                    if position == len(urls) - 1:
+                        raise
+                    _logger.warning(
+                        "Downloading %s failed, %s, trying the next mirror", url, error
+                    )
+
+        metrics.status = "downloaded"
+        metrics.source_url = url
+
+        if cache:
+            cache.store(cache_key, local_path, url=url)
+
+    return local_path
+
+
+def _download_url(
+    url,
+    local_path,
+    pool,
+    segment_threshold,
+    segments,
+    buffer_size,
+    metrics,
+    retry_policy,
+):
+    size = None
+    if segment_threshold is not None and segments > 1:
+        size = _remote_size_if_ranges_accepted(url, pool, retry_policy)
+
+    if size is not None and size >= segment_threshold:
+        return download_url_in_segments(
+            url,
+            local_path,
+            size=size,
+            segments=segments,
+            pool=pool,
+            buffer_size=buffer_size,
+            metrics=metrics,
+            retry_policy=retry_policy,
+        )
+    return download_url_in_chuncks(
+        url,
+        local_path,
+        pool=pool,
+        buffer_size=buffer_size,
+        metrics=metrics,
+        retry_policy=retry_policy,
+    )
+
+
+def _remote_size_if_ranges_accepted(
+    url: str, pool: ConnectionPool, retry_policy: RetryPolicy
+) -> Optional[int]:
+    """Asks the server for the size of the file with a HEAD request.
+    Returns None if the size is unknown or the server does not accept
+    range requests."""
+
+    if urlparse(url).scheme not in ("http", "https"):
+        return None
+    try:
+        accept_ranges, content_length = retry_policy.call(
+            _head_headers, url, pool, retry_policy.timeout
+        )
+    except HTTPError:
+        return None
+    if accept_ranges.lower() != "bytes" or content_length is None:
+        return None
+    return int(content_length)
+
+
+def _head_headers(url: str, pool: ConnectionPool, timeout: Optional[float]):
+    with pool.urlopen(url, method="HEAD", timeout=timeout) as response:
+        return (
+            response.headers.get("Accept-Ranges", "none"),
+            response.headers.get("Content-Length"),
+        )
+
+
+def download_url_in_segments(
+    url: str,
+    local_path: Union[str, Path],
+    size: int,
+    segments: int = _SEGMENTS,
+    pool: Optional[ConnectionPool] = None,
+    buffer_size: int = _BUFFER_SIZE,
+    metrics: Optional[FileMetrics] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+) -> Path:
+    """Downloads a large file as several byte ranges at the same time. The
+    ranges are written into a preallocated .segmented.part file next to
+    local_path which is renamed to local_path once every range has arrived.
+
+    Arguments:
+        url: URL from which to download, the server must accept range requests
+        local_path: The file to write
+        size: The size of the remote file in bytes
+        segments: The number of byte ranges to split the file into
+        pool: The keep-alive connections to download the ranges with
+        buffer_size: The size in bytes of the buffer each range is read into
+        metrics: The FileMetrics to add the bytes and retries of the ranges to
+        retry_policy: How each range is timed out and retried
+
+    Returns
+        Name of file written locally
+    """
+
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+
+    local_path = Path(local_path)
+    part_path = local_path.with_name(local_path.name + ".segmented.part")
+
+    segments = max(1, min(segments, size))
+    bounds = [
+        (size * number // segments, size * (number + 1) // segments - 1)
+        for number in range(segments)
+    ]
+
+    _logger.info("Downloading %s in %d segments", local_path, segments)
+
+    with open(part_path, "wb") as fh:
+        _preallocate(fh, size)
+
+    try:
+        # a pool made here is closed again once this single file is downloaded
+        with ThreadPoolExecutor(max_workers=segments) as executor, (
+            ConnectionPool() if pool is None else nullcontext(pool)
+        ) as pool:
+            futures = [
+                executor.submit(
+                    retry_policy.call,
+                    _download_segment,
+                    url,
+                    part_path,
+                    start,
+                    end,
+                    pool,
+                    buffer_size,
+                    metrics,
+                    retry_policy,
+                    # the bytes of the range written by earlier attempts
+                    [0],
+                    on_retry=_retry_counter(metrics),
+                )
+                for start, end in bounds
+            ]
+            for future in futures:
+                future.result()
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+
+    os.replace(part_path, local_path)
 
     return local_path
 
 
-@retry(HTTPError, tries=3)
-def download_url_in_chuncks(url, local_path):
-    with urlopen(url) as response:
-        # Copy file to disk in chunks
-        print("Downloading {}... ".format(local_path), end="")
+def _download_segment(
+    url, part_path, start, end, pool, buffer_size, metrics, retry_policy, written
+):
+    # a retried range is resumed from the end of the bytes already written
+    offset = start + written[0]
+    with pool.urlopen(
+        url, headers={"Range": f"bytes={offset}-{end}"}, timeout=retry_policy.timeout
+    ) as response:
+        if not _resumes_at(response, offset):
+            raise ValueError(f"{url} did not return the requested byte range")
+
+        with open(part_path, "r+b") as fh:
+            fh.seek(offset)
+            try:
+                stream_response_to_file(
+                    response,
+                    fh,
+                    buffer_size=buffer_size,
+                    size=end - offset + 1,
+                    min_throughput=retry_policy.min_throughput,
+                    stall_window=retry_policy.stall_window,
+                )
+            except StalledDownloadError:
+                if metrics is not None:
+                    metrics.add_stall()
+                raise
+            finally:
+                count = fh.tell() - offset
+                written[0] += count
+                if metrics is not None:
+                    metrics.add_bytes(count)
+
+    if written[0] != end - start + 1:
+        raise IncompleteRead(b"", end - start + 1 - written[0])
+
+
+def download_url_in_chuncks(
+    url,
+    local_path,
+    pool=None,
+    buffer_size=_BUFFER_SIZE,
+    metrics=None,
+    retry_policy=None,
+):
+    """Streams the url to a .part file next to local_path and renames it to
+    local_path once the whole file has arrived, so an interrupted download
+    never leaves a truncated file at local_path. If a .part file is left
+    over from an earlier attempt the download is resumed from the end of it
+    with a HTTP Range request. Requests that fail with a transient error are
+    retried, resuming from the .part file, following the retry_policy."""
+
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+
+    # a pool made here is closed again once this single file is downloaded
+    with ConnectionPool() if pool is None else nullcontext(pool) as pool:
+        return retry_policy.call(
+            _download_url_in_chuncks_once,
+            url,
+            Path(local_path),
+            pool,
+            buffer_size,
+            metrics,
+            retry_policy,
+            on_retry=_retry_counter(metrics),
+        )
 
-        with open(local_path, "wb") as fh:
-            while True:
-                chunk = response.read(_BLOCK_SIZE)
-                if not chunk:
-                    break
-                fh.write(chunk)
-            print("")
 
+def _download_url_in_chuncks_once(
+    url, local_path, pool, buffer_size, metrics, retry_policy
+):
+    part_path = local_path.with_name(local_path.name + ".part")
+
+    offset = part_path.stat().st_size if part_path.is_file() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset > 0 else None
+
+    try:
+        with pool.urlopen(
+            url, headers=headers, timeout=retry_policy.timeout
+        ) as response:
+            if offset > 0 and _resumes_at(response, offset):
+                _logger.info("Resuming download of %s from byte %d", local_path, offset)
+                mode = "r+b"
+            else:
+                _logger.info("Downloading %s", local_path)
+                offset = 0
+                mode = "wb"
+
+            content_length = response.headers.get("Content-Length")
+
+            # Copy file to disk in chunks. The .part file is not preallocated
+            # as its size is the offset a later run resumes from, even after
+            # the process is killed
+            with open(part_path, mode) as fh:
+                fh.seek(offset)
+                try:
+                    stream_response_to_file(
+                        response,
+                        fh,
+                        buffer_size=buffer_size,
+                        size=None if content_length is None else int(content_length),
+                        min_throughput=retry_policy.min_throughput,
+                        stall_window=retry_policy.stall_window,
+                    )
+                except StalledDownloadError:
+                    if metrics is not None:
+                        metrics.add_stall()
+                    raise
+                finally:
+                    if metrics is not None:
+                        metrics.add_bytes(fh.tell() - offset)
+                size = fh.tell()
+    except HTTPError as error:
+        if error.code != 416 or offset == 0:
+            raise
+        # the .part file does not match the remote file so it is removed and
+        # the download starts from zero
+        part_path.unlink(missing_ok=True)
+        return _download_url_in_chuncks_once(
+            url, local_path, pool, buffer_size, metrics, retry_policy
+        )
+
+    if content_length is not None and size != offset + int(content_length):
+        raise IncompleteRead(b"", offset + int(content_length) - size)
+
+    os.replace(part_path, local_path)
+
+    return local_path
+
+
+def _retry_counter(metrics: Optional[FileMetrics]):
+    """The on_retry callback that counts the retries of a file"""
+
+    if metrics is None:
+        return None
+    return lambda error: metrics.add_retry()
+
+
+def stream_response_to_file(
+    response,
+    fh,
+    buffer_size: int = _BUFFER_SIZE,
+    size: Optional[int] = None,
+    min_throughput: Optional[float] = None,
+    stall_window: float = 30,
+) -> int:
+    """Copies the body of the response to the open file. The response is
+    read straight into one reusable buffer with readinto so no new bytes
+    object is made for each block.
+
+    Arguments:
+        response: A readable response or file object that supports readinto
+        fh: The binary file to write to, from its current position
+        buffer_size: The size in bytes of the buffer the response is read into
+        size: The expected number of bytes, used to avoid allocating a
+            buffer larger than the whole response
+        min_throughput: The slowest throughput in bytes per second that is
+            accepted, if the response is slower than this over stall_window
+            seconds StalledDownloadError is raised. The bytes written up to
+            then are left in the file. If None the throughput is not checked
+        stall_window: The number of seconds the throughput is measured over
+
+    Returns
+        The number of bytes written
+    """
+
+    if size is not None:
+        buffer_size = max(1, min(buffer_size, size))
+    buffer = memoryview(bytearray(buffer_size))
+
+    written = 0
+    if min_throughput is None:
+        while True:
+            count = response.readinto(buffer)
+            if not count:
+                break
+            fh.write(buffer[:count])
+            written += count
+        return written
+
+    # readinto waits until the whole buffer is filled, which on a slow
+    # connection can take longer than the window, so the throughput is
+    # checked after each receive by reading with readinto1
+    readinto = getattr(response, "readinto1", response.readinto)
+    window_start = time.monotonic()
+    window_written = 0
+    while True:
+        count = readinto(buffer)
+        if not count:
+            break
+        fh.write(buffer[:count])
+        written += count
+        window_written += count
+
+        elapsed = time.monotonic() - window_start
+        if elapsed >= stall_window:
+            if window_written < min_throughput * elapsed:
+                raise StalledDownloadError(
+                    f"The transfer stalled at {window_written / elapsed:.0f} "
+                    f"bytes/s, below the minimum of {min_throughput:.0f} bytes/s"
+                )
+            window_start += elapsed
+            window_written = 0
+    return written
+
+
+def _preallocate(fh, size: int) -> None:
+    """Reserves space for the whole file before it is written so the file
+    system does not have to grow it block by block"""
+
+    fh.flush()
+    try:
+        os.posix_fallocate(fh.fileno(), 0, size)
+    except (AttributeError, OSError):
+        # posix_fallocate is not available on every platform and file system
+        fh.truncate(size)
+
+
+def _resumes_at(response, offset: int) -> bool:
+    """Checks that the response is a partial response starting at offset"""
+
+    if getattr(response, "status", None) != 206:
+        return False
+    content_range = response.headers.get("Content-Range", "")
+    return content_range.startswith(f"bytes {offset}-")
+
+
+async def download_data_frame_of_async(
+    dataframe: pd.DataFrame,
+    destination: Union[str, Path],
+    overwrite: bool = True,
+    max_workers: int = _MAX_WORKERS,
+    pool: Optional[ConnectionPool] = None,
+    report: Optional[DownloadReport] = None,
+    report_file: Union[str, Path, None] = None,
+    progress: Optional[typing.Callable[[FileMetrics, DownloadReport], None]] = None,
+    **kwargs,
+):
+    """Awaitable version of download_data_frame_of. Each file is streamed
+    to disk in a worker thread and a semaphore limits the number of files
+    downloaded at the same time. The returned list of local files is in the
+    same order as the rows of the dataframe. A file that fails to download
+    does not stop the others, the failures are collected and raised together
+    once every download has finished.
+
+    Arguments:
+        dataframe: rows with "url" and "local_file" columns to download
+        destination: Specifies a folder location to save the downloaded files
+        overwrite: If False existing files are not downloaded again
+        max_workers: The maximum number of files downloaded at the same time
+        pool: The keep-alive connections shared by every download in the
+            batch. If None a pool is made for the batch and closed afterwards
+        report: A DownloadReport that the metrics of each file and the
+            totals of the batch are added to
+        report_file: A json file to write the report to once the batch has
+            finished, including when some files failed
+        progress: Called with the FileMetrics of each file and the report as
+            each file finishes
+        kwargs: mirrors, the {library: [mirrors]} to download from in place
+            of the url of each row, see openmc_data_downloader.mirrors, and
+            additional keyword arguments passed to download_single_file
+
+    Returns
+        List of files written locally
+    """
+
+    if max_workers < 1:
+        raise ValueError(f"max_workers must be 1 or more. Not {max_workers}")
+
+    if report is None:
+        report = DownloadReport()
+    metrics = [
+        FileMetrics(url, local_file)
+        for url, local_file in zip(dataframe["url"], dataframe["local_file"])
+    ]
+    report.files.extend(metrics)
+
+    def on_file(file_metrics, result):
+        if progress is not None:
+            progress(file_metrics, report)
+
+    try:
+        if len(dataframe) == 0:
+            return []
+        results = await _download_rows_async(
+            dataframe,
+            destination,
+            overwrite,
+            max_workers,
+            pool,
+            report,
+            metrics,
+            on_file,
+            **kwargs,
+        )
+    finally:
+        if report_file is not None:
+            report.write_json(report_file)
+    _raise_failures(dataframe["url"], results)
+
+    return results
+
+
+async def _download_rows_async(
+    dataframe: pd.DataFrame,
+    destination: Union[str, Path],
+    overwrite: bool,
+    max_workers: int,
+    pool: Optional[ConnectionPool],
+    report: DownloadReport,
+    metrics: List[FileMetrics],
+    on_file: typing.Callable[[FileMetrics, typing.Any], None],
+    mirrors: Optional[typing.Dict[str, List[str]]] = None,
+    **kwargs,
+) -> list:
+    """Downloads every row of the dataframe and returns the local file or
+    the exception raised for each row. Files of libraries with mirrors are
+    downloaded from the fastest mirror, falling back to the other mirrors
+    and then to the url of the row. The outcome of each row is recorded in
+    its FileMetrics, on_file is called with them and the result of each row
+    as it finishes, and the totals of the batch are added to the report."""
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_workers)
+    start = time.perf_counter()
+
+    # a pool made here is closed again once the batch has finished
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, (
+        ConnectionPool() if pool is None else nullcontext(pool)
+    ) as pool:
+
+        opened, reused = pool.opened, pool.reused
+
+        async def download_row(url, mirror_urls, local_file, cache_key, file_metrics):
+            async with semaphore:
+                try:
+                    result = await loop.run_in_executor(
+                        executor,
+                        functools.partial(
+                            _measured_download,
+                            file_metrics,
+                            url=url,
+                            mirror_urls=mirror_urls,
+                            output_filename=local_file,
+                            destination=destination,
+                            overwrite=overwrite,
+                            pool=pool,
+                            cache_key=cache_key,
+                            **kwargs,
+                        ),
+                    )
+                except Exception as error:
+                    result = error
+            on_file(file_metrics, result)
+            return result
+
+        if "library" in dataframe and "remote_file" in dataframe:
+            cache_keys = dataframe["library"] + "/" + dataframe["remote_file"]
+        else:
+            cache_keys = [None] * len(dataframe)
+
+        row_mirror_urls = _lazy_mirror_urls(
+            dataframe, configured_mirrors(mirrors), pool, kwargs.get("retry_policy")
+        )
+
+        results = await asyncio.gather(
+            *[
+                download_row(url, mirror_urls, local_file, cache_key, file_metrics)
+                for url, mirror_urls, local_file, cache_key, file_metrics in zip(
+                    dataframe["url"],
+                    row_mirror_urls,
+                    dataframe["local_file"],
+                    cache_keys,
+                    metrics,
+                )
+            ],
+            return_exceptions=True,
+        )
+
+    report.seconds += time.perf_counter() - start
+    report.connections_opened += pool.opened - opened
+    report.connections_reused += pool.reused - reused
+    _logger.debug("Opened %d connections and reused %d", pool.opened, pool.reused)
+
+    return results
+
+
+def _measured_download(metrics: FileMetrics, **kwargs) -> Path:
+    """Runs download_single_file and records the time taken, and the error
+    if it fails, in the metrics"""
+
+    start = time.perf_counter()
+    try:
+        local_path = download_single_file(metrics=metrics, **kwargs)
+    except BaseException as error:
+        metrics.status = "failed"
+        metrics.error = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        # files waited for in a second pass keep the time of the first
+        metrics.seconds += time.perf_counter() - start
+    metrics.error = None
     return local_path
 
 
+def _lazy_mirror_urls(
+    dataframe: pd.DataFrame,
+    mirrors: typing.Dict[str, List[str]],
+    pool,
+    retry_policy: Optional[RetryPolicy] = None,
+) -> list:
+    """A function for each row that returns the urls of the file on the
+    mirrors of its library, fastest first. The mirrors of a library are
+    ranked the first time one of its files is downloaded, so a batch of
+    files that are already in the destination does not contact the
+    mirrors, and mirrors that do not answer are left out."""
+
+    if not mirrors or "library" not in dataframe:
+        return [()] * len(dataframe)
+
+    ranked_mirrors = {}
+    lock = threading.Lock()
+
+    def row_mirror_urls(library, url):
+        # rows of the same library wait for the first to rank the mirrors
+        with lock:
+            if library not in ranked_mirrors:
+                candidates = {}
+                for mirror in library_mirrors(library, mirrors):
+                    candidate = mirror_url(url, mirror)
+                    if candidate is not None:
+                        candidates[candidate] = mirror
+                ranked = rank_mirrors(
+                    list(candidates),
+                    pool,
+                    retry_policy=retry_policy,
+                    drop_unavailable=True,
+                )
+                ranked_mirrors[library] = [
+                    candidates[candidate] for candidate in ranked
+                ]
+        urls = [mirror_url(url, mirror) for mirror in ranked_mirrors[library]]
+        return [url for url in urls if url is not None]
+
+    return [
+        functools.partial(row_mirror_urls, library, url)
+        for library, url in zip(dataframe["library"], dataframe["url"])
+    ]
+
+
+def _raise_failures(urls: typing.Iterable[str], results: list) -> None:
+    failures = [
+        (url, result)
+        for url, result in zip(urls, results)
+        if isinstance(result, BaseException)
+    ]
+    if failures:
+        failed_urls = "\n".join(f"{url}: {exception}" for url, exception in failures)
+        raise RuntimeError(
+            f"{len(failures)} of {len(results)} files failed to download\n{failed_urls}"
+        ) from failures[0][1]
+
+
+async def download_data_frame_cooperatively_async(
+    dataframe: pd.DataFrame,
+    destination: Union[str, Path],
+    partition: typing.Tuple[int, int],
+    max_workers: int = _MAX_WORKERS,
+    lock_timeout: Optional[float] = None,
+    pool: Optional[ConnectionPool] = None,
+    report: Optional[DownloadReport] = None,
+    report_file: Union[str, Path, None] = None,
+    progress: Optional[typing.Callable[[FileMetrics, DownloadReport], None]] = None,
+    **kwargs,
+) -> List[Path]:
+    """Awaitable version of download_data_frame_cooperatively"""
+
+    index, count = partition
+    if not 0 <= index < count:
+        raise ValueError(
+            f"The partition must be (index, count) with 0 <= index < count. Not {partition}"
+        )
+    if max_workers < 1:
+        raise ValueError(f"max_workers must be 1 or more. Not {max_workers}")
+    if kwargs.get("lock_mode", "auto") is None:
+        raise ValueError("Files can not be claimed when lock_mode is None")
+
+    if report is None:
+        report = DownloadReport()
+    metrics = [
+        FileMetrics(url, local_file)
+        for url, local_file in zip(dataframe["url"], dataframe["local_file"])
+    ]
+    report.files.extend(metrics)
+
+    def on_file(file_metrics, result):
+        # files claimed by other workers are reported once they are waited for
+        if progress is not None and not isinstance(result, LockTimeout):
+            progress(file_metrics, report)
+
+    try:
+        if len(dataframe) == 0:
+            return []
+        local_files = await _download_claimed_rows_async(
+            dataframe,
+            destination,
+            partition,
+            max_workers,
+            lock_timeout,
+            pool,
+            report,
+            metrics,
+            on_file,
+            **kwargs,
+        )
+    finally:
+        if report_file is not None:
+            report.write_json(report_file)
+    _raise_failures(dataframe["url"], local_files)
+
+    return local_files
+
+
+async def _download_claimed_rows_async(
+    dataframe: pd.DataFrame,
+    destination: Union[str, Path],
+    partition: typing.Tuple[int, int],
+    max_workers: int,
+    lock_timeout: Optional[float],
+    pool: Optional[ConnectionPool],
+    report: DownloadReport,
+    metrics: List[FileMetrics],
+    on_file: typing.Callable[[FileMetrics, typing.Any], None],
+    **kwargs,
+) -> list:
+    """Claims and downloads the rows of the dataframe and then waits for the
+    rows claimed by other workers. Returns the local file or the exception
+    raised for each row in the order of the dataframe."""
+
+    index, count = partition
+
+    # each worker starts claiming files at a different point of the plan
+    start = index * len(dataframe) // count
+    order = list(range(start, len(dataframe))) + list(range(start))
+    rotated = dataframe.iloc[order]
+    rotated_metrics = [metrics[position] for position in order]
+
+    # files that are locked by another worker fail to be claimed straight away
+    results = await _download_rows_async(
+        rotated,
+        destination,
+        False,
+        max_workers,
+        pool,
+        report,
+        rotated_metrics,
+        on_file,
+        lock_timeout=0,
+        **kwargs,
+    )
+
+    # the files claimed by other workers are waited for and downloaded here
+    # if the worker that claimed a file failed to download it. Network
+    # timeouts are also TimeoutErrors so only failed claims are matched
+    claimed_elsewhere = [
+        position
+        for position, result in enumerate(results)
+        if isinstance(result, LockTimeout)
+    ]
+    if claimed_elsewhere:
+        waited_results = await _download_rows_async(
+            rotated.iloc[claimed_elsewhere],
+            destination,
+            False,
+            max_workers,
+            pool,
+            report,
+            [rotated_metrics[position] for position in claimed_elsewhere],
+            on_file,
+            lock_timeout=lock_timeout,
+            **kwargs,
+        )
+        for position, result in zip(claimed_elsewhere, waited_results):
+            results[position] = result
+
+    local_files = [None] * len(dataframe)
+    for position, result in zip(order, results):
+        local_files[position] = result
+
+    return local_files
+
+
+def download_data_frame_cooperatively(
+    dataframe: pd.DataFrame,
+    destination: Union[str, Path],
+    partition: typing.Tuple[int, int],
+    max_workers: int = _MAX_WORKERS,
+    lock_timeout: Optional[float] = None,
+    pool: Optional[ConnectionPool] = None,
+    **kwargs,
+) -> List[Path]:
+    """Downloads the files in the dataframe together with other processes
+    sharing the destination, for example the ranks of an MPI job. Each
+    worker claims the files it downloads by locking them so every file is
+    downloaded once, and starts claiming at a different point of the
+    dataframe so the workers download different files. Once a worker has
+    claimed all it can it waits for the files claimed by the other workers,
+    and downloads any file whose worker failed to. Files already in the
+    destination are not downloaded again.
+
+    Arguments:
+        dataframe: rows with "url" and "local_file" columns to download
+        destination: The folder shared by the workers
+        partition: The index of this worker and the number of workers
+        max_workers: The maximum number of files this worker downloads at
+            the same time
+        lock_timeout: The number of seconds to wait for the files claimed by
+            other workers. If None they are waited for indefinitely
+        pool: The keep-alive connections to download with
+        kwargs: report, report_file and progress, see
+            download_data_frame_of_async, and additional keyword arguments
+            passed to download_single_file
+
+    Returns
+        List of the local files in the same order as the dataframe
+    """
+
+    return _run_coroutine(
+        download_data_frame_cooperatively_async(
+            dataframe=dataframe,
+            destination=destination,
+            partition=partition,
+            max_workers=max_workers,
+            lock_timeout=lock_timeout,
+            pool=pool,
+            **kwargs,
+        )
+    )
+
+
 def download_data_frame_of(
-    dataframe: pd.DataFrame, destination: Union[str, Path], overwrite: bool = True
+    dataframe: pd.DataFrame,
+    destination: Union[str, Path],
+    overwrite: bool = True,
+    max_workers: int = _MAX_WORKERS,
+    pool: Optional[ConnectionPool] = None,
+    **kwargs,
 ):
-    local_files = []
-    for index, row in dataframe.iterrows():
-        local_file = download_single_file(
-            url=row["url"],
-            output_filename=row["local_file"],
+    """Downloads every file listed in the dataframe, see
+    download_data_frame_of_async for details of the arguments."""
+
+    return _run_coroutine(
+        download_data_frame_of_async(
+            dataframe=dataframe,
             destination=destination,
             overwrite=overwrite,
+            max_workers=max_workers,
+            pool=pool,
+            **kwargs,
         )
-        local_files.append(local_file)
-
-    return local_files
+    )
 
 
 def create_cross_sections_xml(
-    dataframe: pd.DataFrame, destination: Union[str, Path]
+    dataframe: pd.DataFrame,
+    destination: Union[str, Path],
+    from_catalog: bool = False,
+    verify: bool = False,
+    max_workers: int = _MAX_WORKERS,
+    merge: bool = False,
 ) -> str:
-    library = openmc.data.DataLibrary()
-    for index, row in dataframe.iterrows():
-        if destination is None:
-            library.register_file(Path(row["local_file"]))
-        else:
-            library.register_file(Path(destination) / Path(row["local_file"]))
+    """Writes a cross_sections.xml file listing the files in the dataframe
+
+    Arguments:
+        dataframe: rows with "local_file" and "particle" columns and the
+            isotope, element or sab name of each file
+        destination: The folder containing the files, the cross_sections.xml
+            file is written here
+        from_catalog: If True the materials and type of each file are taken
+            from the dataframe instead of opening every file with openmc,
+            which takes seconds when there are hundreds of files on a
+            network file system
+        verify: If True the files are opened to check that they contain the
+            materials and type written to the cross_sections.xml file. h5py
+            only runs one call at a time in a process so large numbers of
+            files are checked in several processes. Requires h5py
+        max_workers: The maximum number of processes verifying files
+        merge: If True the files are added to an existing cross_sections.xml
+            file instead of replacing it. Only files that are not already
+            listed are registered. When a material is already listed from
+            another file the file from the library with the higher priority
+            in the dataframe is kept
+
+    Returns
+        The absolute path of the cross_sections.xml file
+    """
+
     if destination is None:
-        library.export_to_xml("cross_sections.xml")
         cross_sections_xml_path = "cross_sections.xml"
     else:
         if not isinstance(destination, Path):
             destination = Path(destination)
             destination.mkdir(parents=True, exist_ok=True)
-        library.export_to_xml(destination / "cross_sections.xml")
         cross_sections_xml_path = str(destination / "cross_sections.xml")
 
+    existing_entries = []
+    if merge and Path(cross_sections_xml_path).is_file():
+        existing_entries = _read_cross_sections_xml(cross_sections_xml_path)
+
+    # files already listed in the existing cross_sections.xml are not
+    # registered again
+    listed_paths = [entry["path"] for entry in existing_entries]
+    new_rows = dataframe[~dataframe["local_file"].isin(listed_paths)]
+
+    if from_catalog:
+        entries = _cross_sections_entries(new_rows)
+    else:
+        import openmc.data
+
+        library = openmc.data.DataLibrary()
+        for index, row in new_rows.iterrows():
+            if destination is None:
+                library.register_file(Path(row["local_file"]))
+            else:
+                library.register_file(Path(destination) / Path(row["local_file"]))
+
+        if merge:
+            xml_directory = Path(cross_sections_xml_path).absolute().parent
+            entries = [
+                {
+                    "materials": " ".join(entry["materials"]),
+                    "path": os.path.relpath(
+                        Path(entry["path"]).absolute(), xml_directory
+                    ),
+                    "type": entry["type"],
+                }
+                for entry in library
+            ]
+        else:
+            library.export_to_xml(cross_sections_xml_path)
+
+    if merge:
+        if "priority" in dataframe:
+            library_priorities = dict(zip(dataframe["library"], dataframe["priority"]))
+            priorities = new_rows["priority"].tolist()
+        else:
+            library_priorities = {}
+            priorities = [0] * len(new_rows)
+        entries = _merge_cross_sections_entries(
+            existing_entries, entries, priorities, library_priorities
+        )
+
+    if from_catalog or merge:
+        _write_cross_sections_xml(entries, cross_sections_xml_path)
+
     absolute_path = str(Path(cross_sections_xml_path).absolute())
-    print(f"written cross sections xml file to {absolute_path}")
+    _logger.info("written cross sections xml file to %s", absolute_path)
+
+    if verify:
+        _verify_cross_sections_files(
+            _cross_sections_entries(dataframe),
+            Path(absolute_path).parent,
+            max_workers,
+        )
 
     return absolute_path
 
 
-def identify_sabs_to_download(
-    libraries: typing.Tuple[str],
-    sabs: typing.Tuple[str],
-):
-    if sabs == []:
-        return pd.DataFrame()
-    elif sabs == "all" or sabs == ["all"]:
-        sabs = SAB_OPTIONS
-    elif sabs == "stable" or sabs == ["stable"]:
-        sabs = SAB_OPTIONS  # todo check they are all stable, perhaps not UO2
-
-    if len(libraries) == 0:
-        raise ValueError(
-            "At least one library must be selected, options are", LIB_OPTIONS
+def _cross_sections_entries(dataframe: pd.DataFrame) -> typing.List[dict]:
+    """The materials, path and type of each file in the cross_sections.xml
+    format, taken from the plan rather than from the files"""
+
+    entries = []
+    for row in dataframe.to_dict("records"):
+        name_column = _PARTICLE_COLUMNS[row["particle"]][0]
+        entries.append(
+            {
+                "materials": row[name_column],
+                "path": row["local_file"],
+                "type": PARTICLE_TO_XML_TYPE[row["particle"]],
+            }
         )
+    return entries
 
-    for sab in sabs:
-        if sab not in SAB_OPTIONS:
-            raise ValueError(
-                f"Sab passing in {sab} not found in available names {SAB_OPTIONS}"
-            )
 
-    priority_dict = {}
-    for counter, entry in enumerate(libraries):
-        if entry not in LIB_OPTIONS:
-            raise ValueError(
-                f"The library must be one of the following {LIB_OPTIONS}. Not {entry}."
+def _read_cross_sections_xml(path: Union[str, Path]) -> typing.List[dict]:
+    """Reads the materials, path and type of each library in an existing
+    cross_sections.xml file with paths relative to the file"""
+
+    xml_directory = Path(path).absolute().parent
+    root = ET.parse(path).getroot()
+
+    directory = root.find("directory")
+    if directory is None:
+        files_directory = xml_directory
+    else:
+        files_directory = xml_directory / directory.text
+
+    return [
+        {
+            "materials": elem.attrib["materials"],
+            "path": os.path.relpath(
+                files_directory / elem.attrib["path"], xml_directory
+            ),
+            "type": elem.attrib["type"],
+        }
+        for elem in root.iter("library")
+    ]
+
+
+def _merge_cross_sections_entries(
+    existing_entries: typing.List[dict],
+    new_entries: typing.List[dict],
+    priorities: typing.List[int],
+    library_priorities: dict,
+) -> typing.List[dict]:
+    """Adds the new entries to the existing ones. An existing entry for the
+    same materials and type is replaced unless it comes from a library with
+    a higher priority, entries from other libraries are always replaced."""
+
+    def existing_priority(entry):
+        for library, priority in library_priorities.items():
+            if Path(entry["path"]).name.startswith(f"{library}_"):
+                return priority
+        return float("inf")
+
+    merged = list(existing_entries)
+    index_of = {
+        (entry["type"], entry["materials"]): i for i, entry in enumerate(merged)
+    }
+    for entry, priority in zip(new_entries, priorities):
+        key = (entry["type"], entry["materials"])
+        if key not in index_of:
+            index_of[key] = len(merged)
+            merged.append(entry)
+        elif priority <= existing_priority(merged[index_of[key]]):
+            merged[index_of[key]] = entry
+    return merged
+
+
+def _write_cross_sections_xml(
+    entries: typing.List[dict], path: Union[str, Path]
+) -> None:
+    """Writes the entries in the same layout as
+    openmc.data.DataLibrary.export_to_xml with paths relative to the file.
+    The file is written under a temporary name and renamed so an existing
+    file is never left partially written."""
+
+    root = ET.Element("cross_sections")
+    root.text = "\n  "
+    for entry in entries:
+        element = ET.SubElement(root, "library", entry)
+        element.tail = "\n  "
+    if entries:
+        element.tail = "\n"
+
+    path = Path(path)
+    temporary = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        ET.ElementTree(root).write(
+            str(temporary), xml_declaration=True, encoding="utf-8"
+        )
+        os.replace(temporary, path)
+    finally:
+        temporary.unlink(missing_ok=True)
+
+
+def _verify_cross_sections_files(
+    entries: typing.List[dict], directory: Path, max_workers: int
+) -> None:
+    check = functools.partial(_check_cross_sections_file, directory=directory)
+    workers = min(
+        max_workers, os.cpu_count() or 1, len(entries) // _VERIFY_FILES_PER_PROCESS
+    )
+    if workers <= 1:
+        problems = map(check, entries)
+    else:
+        # h5py holds a lock around every call so threads would check the
+        # files one at a time. Processes are spawned as this may be called
+        # from a thread of a program with other threads running
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            problems = list(
+                executor.map(
+                    check, entries, chunksize=-(-len(entries) // (workers * 4))
+                )
             )
+    problems = [problem for problem in problems if problem is not None]
 
-        priority_dict[entry] = counter + 1
+    if problems:
+        raise RuntimeError(
+            f"{len(problems)} of {len(entries)} files do not match the "
+            "cross_sections.xml file\n" + "\n".join(problems)
+        )
 
-    print("Searching libraries with the following priority", priority_dict)
 
-    # Tried to removed this dict to dataframe conversion out of the function
-    # and into the initialization of the package but this resulted in
-    # a SettingwithCopyWarning which can be fixed and understood here
-    # https://www.dataquest.io/blog/settingwithcopywarning/
-    xs_info_df = pd.DataFrame.from_dict(sab_xs_info)
+# starting a process takes about as long as checking this many files on a
+# network file system
+_VERIFY_FILES_PER_PROCESS = 100
+
+
+def _check_cross_sections_file(entry: dict, directory: Path) -> Optional[str]:
+    """Returns a description of how the file differs from its entry or None
+    if it matches"""
+
+    import h5py
+
+    path = directory / entry["path"]
+    if not path.is_file():
+        return f"{path}: file not found"
+    try:
+        with h5py.File(path, "r") as h5_file:
+            # the same attribute openmc.data.DataLibrary.register_file reads
+            file_type = h5_file.attrs["filetype"]
+            materials = list(h5_file)
+    except (OSError, KeyError) as error:
+        return f"{path}: {error}"
+    if isinstance(file_type, bytes):
+        file_type = file_type.decode()
+    file_type = file_type[len("data_") :]
+    if file_type != entry["type"]:
+        return f"{path}: type is {file_type} not {entry['type']}"
+    if entry["materials"] not in materials:
+        return f"{path}: does not contain {entry['materials']}"
+    return None
+
+
+# the columns describing the files of each particle
+_PARTICLE_COLUMNS = {
+    "neutron": ["isotope", "element"],
+    "photon": ["element"],
+    "sab": ["sab"],
+}
+
+_PLAN_COLUMNS = [
+    "library",
+    "remote_file",
+    "url",
+    "local_file",
+    "particle",
+    "isotope",
+    "element",
+    "sab",
+    "priority",
+]
+
+_CATEGORICAL_COLUMNS = ["library", "particle", "name", "isotope", "element", "sab"]
+
+RESOLVE_METHODS = ("auto", "index", "dataframe")
+
+# requests for more names than this scan the whole frame instead of using
+# the index
+_INDEX_THRESHOLD = 200
+
+
+@functools.lru_cache(maxsize=None)
+def _xs_info_dataframe() -> pd.DataFrame:
+    """Every file in every library as a single frame with categorical
+    columns. The frame is built once and shared so it must not be modified.
+    """
 
-    is_library = xs_info_df["library"].isin(libraries)
-    print("Sab found matching library requirements", is_library.values.sum())
+    import pandas as pd
 
-    is_particle = xs_info_df["particle"].isin(["sab"])
-    print("Sab found matching particle requirements", is_particle.values.sum())
+    xs_info_df = pd.DataFrame.from_records(
+        cross_sections_directory.neutron_xs_info
+        + cross_sections_directory.photon_xs_info
+        + cross_sections_directory.sab_xs_info,
+        columns=_PLAN_COLUMNS[:-1],
+    )
+    # the name each file is requested by whatever the particle
+    xs_info_df["name"] = (
+        xs_info_df["sab"].fillna(xs_info_df["isotope"]).fillna(xs_info_df["element"])
+    )
 
-    is_sab = xs_info_df["sab"].isin(sabs)
-    print("Sab found matching isotope requirements", is_sab.values.sum())
+    dtypes = {column: "category" for column in _CATEGORICAL_COLUMNS}
+    # ordered so that plans list neutron, then photon, then sab files
+    dtypes["particle"] = pd.CategoricalDtype(PARTICLE_OPTIONS, ordered=True)
+    return xs_info_df.astype(dtypes)
 
-    xs_info_df = xs_info_df[(is_sab) & (is_library) & (is_particle)]
 
-    xs_info_df["priority"] = xs_info_df["library"].map(priority_dict)
+@functools.lru_cache(maxsize=None)
+def _xs_info_index() -> dict:
+    """Maps each (particle, name) to {library: row of the cached frame}. The
+    index is built once and shared so it must not be modified."""
 
-    xs_info_df = xs_info_df.sort_values(by=["priority"])
+    xs_info_index = {}
+    xs_info_df = _xs_info_dataframe()
+    rows = zip(xs_info_df["particle"], xs_info_df["name"], xs_info_df["library"])
+    for position, (particle, name, library) in enumerate(rows):
+        xs_info_index.setdefault((particle, name), {}).setdefault(library, position)
+    return xs_info_index
 
-    xs_info_df = xs_info_df.drop_duplicates(subset=["sab", "particle"], keep="first")
 
-    # end url is unique so this avoids downloading duplicates of the same file
-    xs_info_df = xs_info_df.drop_duplicates(subset=["url"], keep="first")
+@functools.lru_cache(maxsize=None)
+def _xs_info_particle_order() -> list:
+    """The position of the particle of each row of the cached frame in
+    PARTICLE_OPTIONS"""
 
-    print("Sabs found matching all requirements", len(xs_info_df))
+    return _xs_info_dataframe()["particle"].cat.codes.tolist()
 
-    return xs_info_df
 
+def _expand_keywords(names, all_options, stable_options) -> typing.List[str]:
+    if isinstance(names, str):
+        names = [names]
+    names = list(names)
+    if names == ["all"]:
+        return all_options
+    if names == ["stable"]:
+        return stable_options
+    return names
 
-def identify_isotopes_to_download(
-    libraries: typing.Tuple[str],
-    isotopes: typing.Tuple[str],
-):
-    if isotopes == []:
-        return pd.DataFrame()
-    elif isotopes == "all" or isotopes == ["all"]:
-        isotopes = ALL_ISOTOPE_OPTIONS
-    elif isotopes == "stable" or isotopes == ["stable"]:
-        isotopes = STABLE_ISOTOPE_OPTIONS
 
-    print("isotopes", isotopes)
+def identify_to_download(
+    libraries: typing.Iterable[str],
+    isotopes: typing.Iterable[str] = (),
+    elements: typing.Iterable[str] = (),
+    sabs: typing.Iterable[str] = (),
+    method: str = "auto",
+) -> pd.DataFrame:
+    """Finds the files needed for the neutron isotopes, photon elements and
+    S(a,b) tables in a single pass, taking each from the highest priority
+    library that contains it.
 
-    if len(libraries) == 0:
+    Arguments:
+        libraries: The libraries to search in order of priority
+        isotopes: The isotopes to find neutron files for, "all" or "stable"
+        elements: The elements to find photon files for, "all" or "stable"
+        sabs: The S(a,b) tables to find files for, "all" or "stable"
+        method: How the files are found, "index" looks up each requested
+            name in a prebuilt index, "dataframe" scans every file in the
+            catalog and "auto" uses the index for small requests. Both give
+            the same plan.
+
+    Returns
+        The plan of files to download with the columns library,
+        remote_file, url, local_file, particle, isotope, element, sab and
+        priority. Neutron files are listed first, then photon and then sab.
+    """
+
+    requested = {
+        "neutron": _expand_keywords(
+            isotopes,
+            cross_sections_directory.ALL_ISOTOPE_OPTIONS,
+            STABLE_ISOTOPE_OPTIONS,
+        ),
+        "photon": _expand_keywords(
+            elements,
+            cross_sections_directory.ALL_ELEMENT_OPTIONS,
+            cross_sections_directory.STABLE_ELEMENT_OPTIONS,
+        ),
+        # todo check they are all stable, perhaps not UO2
+        "sab": _expand_keywords(
+            sabs,
+            cross_sections_directory.SAB_OPTIONS,
+            cross_sections_directory.SAB_OPTIONS,
+        ),
+    }
+    requested = {particle: names for particle, names in requested.items() if names}
+
+    if method not in RESOLVE_METHODS:
         raise ValueError(
-            "At least one library must be selected, options are", LIB_OPTIONS
+            f"The method must be one of the following {RESOLVE_METHODS}. Not {method}"
         )
 
+    if requested:
+        if len(libraries) == 0:
+            raise ValueError(
+                "At least one library must be selected, options are",
+                cross_sections_directory.LIB_OPTIONS,
+            )
+
+        for sab in requested.get("sab", []):
+            if sab not in cross_sections_directory.SAB_OPTIONS:
+                raise ValueError(
+                    f"Sab passing in {sab} not found in available names {cross_sections_directory.SAB_OPTIONS}"
+                )
+
     priority_dict = {}
     for counter, entry in enumerate(libraries):
-        if entry not in LIB_OPTIONS:
+        if entry not in cross_sections_directory.LIB_OPTIONS:
             raise ValueError(
-                f"The library must be one of the following {LIB_OPTIONS}. Not {entry}."
+                f"The library must be one of the following {cross_sections_directory.LIB_OPTIONS}. Not {entry}."
             )
+        priority_dict.setdefault(entry, counter + 1)
 
-        priority_dict[entry] = counter + 1
+    _logger.debug("Searching libraries with the following priority %s", priority_dict)
 
-    print("Searching libraries with the following priority", priority_dict)
+    if method == "auto":
+        requested_count = sum(len(names) for names in requested.values())
+        method = "index" if requested_count <= _INDEX_THRESHOLD else "dataframe"
 
-    # Tried to removed this dict to dataframe conversion out of the function
-    # and into the initialization of the package but this resulted in
-    # a SettingwithCopyWarning which can be fixed and understood here
-    # https://www.dataquest.io/blog/settingwithcopywarning/
-    xs_info_df = pd.DataFrame.from_dict(neutron_xs_info)
+    if method == "index":
+        plan = _plan_from_index(requested, priority_dict)
+    else:
+        plan = _plan_from_dataframe(requested, priority_dict)
+
+    plan = plan.astype({column: object for column in _CATEGORICAL_COLUMNS})
 
-    is_library = xs_info_df["library"].isin(libraries)
-    print("Isotopes found matching library requirements", is_library.values.sum())
+    _logger.info("Files found matching all requirements %d", len(plan))
 
-    is_particle = xs_info_df["particle"].isin(["neutron"])
-    print("Isotopes found matching particle requirements", is_particle.values.sum())
+    return plan[_PLAN_COLUMNS]
 
-    is_isotope = xs_info_df["isotope"].isin(isotopes)
-    print("Isotopes found matching isotope requirements", is_isotope.values.sum())
 
-    xs_info_df = xs_info_df[(is_isotope) & (is_library) & (is_particle)]
+def _plan_from_dataframe(requested: dict, priority_dict: dict) -> pd.DataFrame:
+    """Selects the files by scanning every row of the cached frame"""
 
-    xs_info_df["priority"] = xs_info_df["library"].map(priority_dict)
+    import numpy as np
 
-    xs_info_df = xs_info_df.sort_values(by=["priority"])
+    xs_info_df = _xs_info_dataframe()
 
-    xs_info_df = xs_info_df.drop_duplicates(
-        subset=["isotope", "particle"], keep="first"
+    # priorities are looked up by category code, 0 marks an unused library
+    library_column = xs_info_df["library"].cat
+    priority_of_code = np.array(
+        [priority_dict.get(library, 0) for library in library_column.categories]
     )
+    priority = priority_of_code[library_column.codes.to_numpy()]
+
+    is_requested = np.zeros(len(xs_info_df), dtype=bool)
+    for particle, names in requested.items():
+        is_particle = (xs_info_df["particle"] == particle).to_numpy()
+        is_name = xs_info_df["name"].isin(names).to_numpy()
+        is_requested |= is_particle & is_name
+
+    is_selected = is_requested & (priority > 0)
+    plan = xs_info_df[is_selected].assign(priority=priority[is_selected])
+
+    # stable sorting keeps the order of the files within each library
+    plan = plan.sort_values(by=["particle", "priority"], kind="stable")
+
+    plan = plan.drop_duplicates(subset=["particle", "name"], keep="first")
 
     # end url is unique so this avoids downloading duplicates of the same file
-    xs_info_df = xs_info_df.drop_duplicates(subset=["url"], keep="first")
+    return plan.drop_duplicates(subset=["url"], keep="first")
 
-    print("Isotopes found matching all requirements", len(xs_info_df))
 
-    return xs_info_df
+def _plan_from_index(requested: dict, priority_dict: dict) -> pd.DataFrame:
+    """Selects the files by looking up each requested name in the cached
+    index so the cost grows with the size of the request rather than the
+    size of the catalog"""
 
+    import numpy as np
 
-def identify_elements_to_download(
-    libraries: typing.Tuple[str],
-    elements: typing.Tuple[str],
-):
-    if elements == []:
-        return pd.DataFrame()
-    elif elements == "all" or elements == ["all"]:
-        elements = ALL_ELEMENT_OPTIONS
-    elif elements == "stable" or elements == ["stable"]:
-        elements = STABLE_ELEMENT_OPTIONS
+    xs_info_index = _xs_info_index()
+    libraries = sorted(priority_dict, key=priority_dict.get)
 
-    print("elements", elements)
+    selected = {}
+    for particle, names in requested.items():
+        for name in names:
+            rows = xs_info_index.get((particle, name))
+            if rows is None:
+                continue
+            for library in libraries:
+                if library in rows:
+                    selected[rows[library]] = priority_dict[library]
+                    break
 
-    if len(libraries) == 0:
-        raise ValueError(
-            "At least one library must be selected, options are", LIB_OPTIONS
-        )
+    # the same order as the stable sort in _plan_from_dataframe
+    particle_order = _xs_info_particle_order()
+    positions = sorted(
+        selected,
+        key=lambda position: (particle_order[position], selected[position], position),
+    )
 
-    priority_dict = {}
-    for counter, entry in enumerate(libraries):
-        if entry not in LIB_OPTIONS:
-            raise ValueError("The library must be one of the following", LIB_OPTIONS)
+    priority = np.array([selected[p] for p in positions], dtype=int)
+    return _xs_info_dataframe().iloc[positions].assign(priority=priority)
 
-        priority_dict[entry] = counter + 1
 
-    print("Searching libraries with the following priority", priority_dict)
+def _particle_plan(plan: pd.DataFrame, particle: str) -> pd.DataFrame:
+    """Keeps just the columns used by the files of one particle"""
 
-    # Tried to removed this dict to dataframe conversion out of the function
-    # and into the initialization of the package but this resulted in
-    # a SettingwithCopyWarning which can be fixed and understood here
-    # https://www.dataquest.io/blog/settingwithcopywarning/
-    xs_info_df = pd.DataFrame.from_dict(photon_xs_info)
+    return plan[_PLAN_COLUMNS[:5] + _PARTICLE_COLUMNS[particle] + ["priority"]]
 
-    is_library = xs_info_df["library"].isin(libraries)
-    print("Elements found matching library requirements", is_library.values.sum())
 
-    is_particle = xs_info_df["particle"].isin(["photon"])
-    print("Elements found matching particle requirements", is_particle.values.sum())
+def identify_sabs_to_download(
+    libraries: typing.Tuple[str],
+    sabs: typing.Tuple[str],
+):
+    return _particle_plan(identify_to_download(libraries, sabs=sabs), "sab")
 
-    is_element = xs_info_df["element"].isin(elements)
-    print("Elements found matching element requirements", is_element.values.sum())
 
-    xs_info_df = xs_info_df[(is_element) & (is_library) & (is_particle)]
+def identify_isotopes_to_download(
+    libraries: typing.Tuple[str],
+    isotopes: typing.Tuple[str],
+):
+    return _particle_plan(identify_to_download(libraries, isotopes=isotopes), "neutron")
+
 
-    xs_info_df["priority"] = xs_info_df["library"].map(priority_dict)
+def identify_elements_to_download(
+    libraries: typing.Tuple[str],
+    elements: typing.Tuple[str],
+):
+    return _particle_plan(identify_to_download(libraries, elements=elements), "photon")
 
-    xs_info_df = xs_info_df.sort_values(by=["priority"])
 
-    xs_info_df = xs_info_df.drop_duplicates(
-        subset=["element", "particle"], keep="first"
+def _add_materials_methods(openmc_module) -> None:
+    openmc_module.Materials.download_cross_section_data = download_cross_section_data
+    openmc_module.Materials.download_cross_section_data_async = (
+        download_cross_section_data_async
+    )
+    openmc_module.Materials.pack_cross_section_data = pack_cross_section_data
+    openmc_module.Materials.pack_cross_section_data_async = (
+        pack_cross_section_data_async
     )
 
-    # end url is unique so this avoids downloading duplicates of the same file
-    xs_info_df = xs_info_df.drop_duplicates(subset=["url"], keep="first")
 
-    print("Elements found matching all requirements", len(xs_info_df))
+class _OpenmcImportHook(importlib.abc.MetaPathFinder):
+    """Adds the download methods to openmc.Materials as soon as openmc has
+    been imported, so openmc itself is not imported by this package. The
+    hook stays installed until openmc is actually executed as tools often
+    look for openmc with importlib.util.find_spec without importing it."""
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != "openmc":
+            return None
+
+        # openmc is looked for with the finders after this one so the search
+        # does not come back to this finder
+        for finder in sys.meta_path[sys.meta_path.index(self) + 1 :]:
+            find_spec = getattr(finder, "find_spec", None)
+            spec = None if find_spec is None else find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return spec
+
+        exec_module = spec.loader.exec_module
+
+        def exec_module_and_add_methods(module):
+            exec_module(module)
+            if self in sys.meta_path:
+                sys.meta_path.remove(self)
+            _add_materials_methods(module)
 
-    return xs_info_df
+        spec.loader.exec_module = exec_module_and_add_methods
+        return spec
 
 
-openmc.Materials.download_cross_section_data = download_cross_section_data
+if "openmc" in sys.modules:
+    _add_materials_methods(sys.modules["openmc"])
+else:
+    sys.meta_path.insert(0, _OpenmcImportHook())
@@ -0,0 +1,49 @@
+"""Times downloading a batch of synthetic h5 files from the local threaded
+HTTP server, with one and with several files at the same time. Run with
+pytest tests/benchmarks --benchmark-only"""
+
+import os
+
+import pytest
+
+from openmc_data_downloader import DownloadReport, download_data_frame_of
+
+pytest.importorskip("pytest_benchmark")
+pd = pytest.importorskip("pandas")
+
+FILE_COUNT = 200
+FILE_SIZE = 256 * 1024
+
+
+@pytest.fixture
+def served_plan(http_server):
+    names = [f"Xx{number}" for number in range(FILE_COUNT)]
+    for name in names:
+        (http_server.served_dir / f"{name}.h5").write_bytes(os.urandom(FILE_SIZE))
+    return pd.DataFrame.from_dict(
+        {
+            "url": [f"{http_server.base_url}{name}.h5" for name in names],
+            "local_file": [f"BENCH_{name}.h5" for name in names],
+        }
+    )
+
+
+@pytest.mark.benchmark(group="download")
+@pytest.mark.parametrize("max_workers", [1, 8])
+def test_bench_download_data_frame_of(benchmark, served_plan, tmp_path, max_workers):
+    report = DownloadReport()
+
+    benchmark.pedantic(
+        download_data_frame_of,
+        args=(served_plan, tmp_path),
+        kwargs={"max_workers": max_workers, "cache": False, "report": report},
+        rounds=3,
+    )
+
+    benchmark.extra_info["files"] = FILE_COUNT
+    benchmark.extra_info["file_seconds"] = report.summary()["file_seconds"]
+    # the timings are not collected when run with --benchmark-disable
+    if not benchmark.disabled:
+        benchmark.extra_info["MB/s"] = (
+            FILE_COUNT * FILE_SIZE / benchmark.stats["mean"] / 1e6
+        )
@@ -0,0 +1,36 @@
+"""Times importing the package in a fresh interpreter and building the
+cross section tables. Run with pytest tests/benchmarks --benchmark-only"""
+
+import importlib
+import subprocess
+import sys
+
+import pytest
+
+from openmc_data_downloader import catalog, cross_sections_directory
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.mark.benchmark(group="import")
+def test_bench_import_package(benchmark):
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable, "-c", "import openmc_data_downloader"],),
+        kwargs={"check": True},
+        rounds=5,
+    )
+
+
+@pytest.mark.benchmark(group="import")
+def test_bench_reload_cross_sections_directory(benchmark):
+    benchmark(importlib.reload, cross_sections_directory)
+
+
+@pytest.mark.benchmark(group="import")
+def test_bench_load_catalog(benchmark):
+    def load_catalog():
+        catalog.load_catalog.cache_clear()
+        return catalog.load_catalog()
+
+    benchmark(load_catalog)
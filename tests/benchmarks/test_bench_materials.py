@@ -0,0 +1,53 @@
+"""Times finding the nuclides, elements and S(a,b) tables of a depletion
+model with 10k materials, each a burnt fuel with a few hundred nuclides, and
+finding the files to download for them. Run with
+pytest tests/benchmarks --benchmark-only"""
+
+import pytest
+
+from openmc_data_downloader import (
+    cross_sections_directory,
+    expand_materials,
+    identify_materials_to_download,
+)
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("pandas")
+openmc = pytest.importorskip("openmc")
+
+MATERIALS = 10_000
+NUCLIDES_PER_MATERIAL = 300
+
+
+@pytest.fixture(scope="module")
+def depletion_materials():
+    nuclides = cross_sections_directory.STABLE_ISOTOPE_OPTIONS
+    materials = []
+    for index in range(MATERIALS):
+        material = openmc.Material()
+        # each material has a different selection of the nuclides
+        for position in range(NUCLIDES_PER_MATERIAL):
+            nuclide = nuclides[(index + position * 7) % len(nuclides)]
+            material.add_nuclide(nuclide, 1e-6)
+        if index % 10 == 0:
+            material.add_s_alpha_beta("c_H_in_H2O")
+        materials.append(material)
+    return openmc.Materials(materials)
+
+
+@pytest.mark.benchmark(group="materials")
+def test_bench_expand_materials(benchmark, depletion_materials):
+    isotopes, elements, sabs = benchmark(expand_materials, depletion_materials)
+    assert len(isotopes) == len(cross_sections_directory.STABLE_ISOTOPE_OPTIONS)
+    assert sabs == {"c_H_in_H2O"}
+
+
+@pytest.mark.benchmark(group="materials")
+def test_bench_identify_materials_to_download(benchmark, depletion_materials):
+    plan = benchmark(
+        identify_materials_to_download,
+        depletion_materials,
+        ["TENDL-2019", "ENDFB-7.1-NNDC"],
+        ["neutron", "photon"],
+    )
+    assert len(plan) > 0
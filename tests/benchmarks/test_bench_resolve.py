@@ -0,0 +1,72 @@
+"""Times finding the files to download for a typical request of about 20
+nuclides and for every nuclide, with the index and the dataframe, and for
+every file of each particle in all four libraries through the identify_*
+functions. Run with pytest tests/benchmarks --benchmark-only"""
+
+import pytest
+
+from openmc_data_downloader import (
+    cross_sections_directory,
+    identify_elements_to_download,
+    identify_isotopes_to_download,
+    identify_sabs_to_download,
+    identify_to_download,
+)
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("pandas")
+
+LIBRARIES = ["ENDFB-7.1-NNDC", "TENDL-2019"]
+
+TYPICAL_REQUEST = {
+    "isotopes": [
+        "H1",
+        "H2",
+        "O16",
+        "O17",
+        "Li6",
+        "Li7",
+        "Be9",
+        "C12",
+        "C13",
+        "Fe54",
+        "Fe56",
+        "Fe57",
+        "Fe58",
+        "Cr52",
+        "Ni58",
+        "W184",
+    ],
+    "elements": ["H", "O", "Fe"],
+    "sabs": ["c_H_in_H2O"],
+}
+
+ALL_REQUEST = {"isotopes": "all", "elements": "all", "sabs": "all"}
+
+
+@pytest.mark.benchmark(group="resolve typical")
+@pytest.mark.parametrize("method", ["index", "dataframe"])
+def test_bench_resolve_typical_request(benchmark, method):
+    plan = benchmark(identify_to_download, LIBRARIES, method=method, **TYPICAL_REQUEST)
+    assert len(plan) == 20
+
+
+@pytest.mark.benchmark(group="resolve all")
+@pytest.mark.parametrize("method", ["index", "dataframe"])
+def test_bench_resolve_all(benchmark, method):
+    benchmark(identify_to_download, LIBRARIES, method=method, **ALL_REQUEST)
+
+
+@pytest.mark.benchmark(group="resolve all libraries")
+@pytest.mark.parametrize(
+    "identify",
+    [
+        identify_isotopes_to_download,
+        identify_elements_to_download,
+        identify_sabs_to_download,
+    ],
+)
+def test_bench_identify_all_from_all_libraries(benchmark, identify):
+    plan = benchmark(identify, cross_sections_directory.LIB_OPTIONS, "all")
+    assert len(plan) > 0
+    benchmark.extra_info["files"] = len(plan)
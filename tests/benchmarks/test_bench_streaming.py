@@ -0,0 +1,78 @@
+"""Compares the readinto based streaming writer with the 16 KiB read loop it
+replaced. The writers are timed on their own, copying an in-memory response
+to os.devnull so the disk does not hide the cost of the copy, and end to end downloading from the local test server, where the
+single threaded server rather than the writer limits the speed. Run with
+pytest tests/benchmarks --benchmark-only"""
+
+import io
+import os
+
+import pytest
+
+from openmc_data_downloader import ConnectionPool, stream_response_to_file
+
+pytest.importorskip("pytest_benchmark")
+
+FILE_SIZE = 64 * 1024 * 1024
+
+
+def read_loop_to_file(response, fh, block_size=16384):
+    while True:
+        chunk = response.read(block_size)
+        if not chunk:
+            break
+        fh.write(chunk)
+
+
+WRITERS = {
+    "read_loop_16_kib": read_loop_to_file,
+    "stream_response_to_file": stream_response_to_file,
+}
+
+
+def record_throughput(benchmark):
+    # the timings are not collected when run with --benchmark-disable
+    if not benchmark.disabled:
+        benchmark.extra_info["MB/s"] = FILE_SIZE / benchmark.stats["mean"] / 1e6
+
+
+@pytest.fixture(scope="module")
+def large_file_data():
+    return os.urandom(FILE_SIZE)
+
+
+@pytest.fixture
+def large_file_url(http_server, large_file_data):
+    (http_server.served_dir / "U238.h5").write_bytes(large_file_data)
+    return http_server.base_url + "U238.h5"
+
+
+def copy_with(writer, data):
+    # a buffered reader over the data behaves like the body of a response
+    with io.BufferedReader(io.BytesIO(data)) as response:
+        with open(os.devnull, "wb") as fh:
+            writer(response, fh)
+
+
+def download_with(writer, url, local_path, pool):
+    with pool.urlopen(url) as response, open(local_path, "wb") as fh:
+        writer(response, fh)
+
+
+@pytest.mark.benchmark(group="streaming writer")
+@pytest.mark.parametrize("writer", WRITERS)
+def test_bench_writer(benchmark, large_file_data, writer):
+    benchmark.pedantic(copy_with, args=(WRITERS[writer], large_file_data), rounds=20)
+    record_throughput(benchmark)
+
+
+@pytest.mark.benchmark(group="streaming download")
+@pytest.mark.parametrize("writer", WRITERS)
+def test_bench_download(benchmark, large_file_url, tmp_path, writer):
+    with ConnectionPool() as pool:
+        benchmark.pedantic(
+            download_with,
+            args=(WRITERS[writer], large_file_url, tmp_path / "U238.h5", pool),
+            rounds=5,
+        )
+    record_throughput(benchmark)
@@ -0,0 +1,68 @@
+"""Times writing the cross_sections.xml file for every TENDL 2019 neutron
+file, from the catalog and by opening each file with openmc, merging it into
+an existing file and verifying the files against it. Run with pytest
+tests/benchmarks --benchmark-only"""
+
+import pytest
+
+from openmc_data_downloader import create_cross_sections_xml, identify_to_download
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("pandas")
+
+
+@pytest.fixture(scope="module")
+def plan():
+    return identify_to_download(["TENDL-2019"], isotopes="all")
+
+
+@pytest.fixture(scope="module")
+def library(plan, tmp_path_factory):
+    """A destination with a small synthetic h5 file for each file in the
+    plan, with the attributes openmc reads"""
+
+    h5py = pytest.importorskip("h5py")
+
+    destination = tmp_path_factory.mktemp("library")
+    for local_file, isotope in zip(plan["local_file"], plan["isotope"]):
+        with h5py.File(destination / local_file, "w") as h5_file:
+            h5_file.attrs["filetype"] = b"data_neutron"
+            h5_file.create_group(isotope)
+    return destination
+
+
+@pytest.mark.benchmark(group="cross_sections.xml")
+def test_bench_create_cross_sections_xml_from_catalog(benchmark, plan, tmp_path):
+    benchmark(create_cross_sections_xml, plan, tmp_path, from_catalog=True)
+    benchmark.extra_info["files"] = len(plan)
+
+
+@pytest.mark.benchmark(group="cross_sections.xml")
+def test_bench_create_cross_sections_xml_opening_files(benchmark, plan, library):
+    pytest.importorskip("openmc")
+
+    benchmark(create_cross_sections_xml, plan, library)
+    benchmark.extra_info["files"] = len(plan)
+
+
+@pytest.mark.benchmark(group="cross_sections.xml")
+def test_bench_create_cross_sections_xml_merge(benchmark, plan, tmp_path):
+    half = len(plan) // 2
+
+    def write_first_half():
+        create_cross_sections_xml(plan.iloc[:half], tmp_path, from_catalog=True)
+        return (plan, tmp_path), {"from_catalog": True, "merge": True}
+
+    benchmark.pedantic(create_cross_sections_xml, setup=write_first_half, rounds=10)
+    benchmark.extra_info["files"] = len(plan)
+
+
+@pytest.mark.benchmark(group="cross_sections.xml")
+def test_bench_create_cross_sections_xml_verify(benchmark, plan, library):
+    benchmark.pedantic(
+        create_cross_sections_xml,
+        args=(plan, library),
+        kwargs={"from_catalog": True, "verify": True},
+        rounds=5,
+    )
+    benchmark.extra_info["files"] = len(plan)
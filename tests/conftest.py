@@ -0,0 +1,130 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+
+import pytest
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """Serves files over keep-alive connections with support for Range
+    requests. Paths starting with /redirect/ are redirected to the rest of
+    the path, in the same way as github.com redirects raw files to
+    raw.githubusercontent.com"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_file(send_body=False)
+
+    def do_GET(self):
+        self.send_file(send_body=True)
+
+    def send_file(self, send_body):
+        self.server.requests.append((self.command, self.path, self.headers["Range"]))
+
+        if self.server.errors:
+            status, headers = self.server.errors.pop(0)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self.path.startswith("/redirect/"):
+            self.send_response(302)
+            self.send_header("Location", self.path[len("/redirect") :])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        # requests sent through a proxy name the whole url
+        path = Path(self.server.served_dir) / urlparse(self.path).path.lstrip("/")
+        if not path.is_file():
+            self.send_error(404)
+            return
+
+        data = path.read_bytes()
+        start, end = 0, len(data) - 1
+        status = 200
+        if self.headers["Range"] is not None:
+            first, last = self.headers["Range"][len("bytes=") :].split("-")
+            start = int(first)
+            if last:
+                end = min(int(last), end)
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        body = data[start : end + 1]
+        self.send_response(status)
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not send_body:
+            return
+
+        if self.server.interrupt_after is not None:
+            # sends part of the body and then drops the connection
+            self.server.interrupt_after, cut = None, self.server.interrupt_after
+            self.wfile.write(body[:cut])
+            self.close_connection = True
+            return
+        if self.server.throttle is not None:
+            # sends part of the body and then trickles out the rest
+            self.server.throttle, (cut, delay) = None, self.server.throttle
+            self.wfile.write(body[:cut])
+            try:
+                for start in range(cut, len(body), 16):
+                    self.wfile.flush()
+                    time.sleep(delay)
+                    self.wfile.write(body[start : start + 16])
+            except ConnectionError:
+                # the client aborted the slow response
+                self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def http_server(tmp_path):
+    """A local threaded HTTP server serving the files in server.served_dir
+    at server.base_url. Every request is logged to server.requests and
+    setting server.interrupt_after drops the next response after that many
+    bytes of the body. Setting server.throttle to (bytes, delay) sends that
+    many bytes of the next response and then 16 bytes every delay seconds.
+    Each (status, headers) in server.errors is sent in place of the next
+    response"""
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    server.served_dir = tmp_path / "served"
+    server.served_dir.mkdir()
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    server.requests = []
+    server.interrupt_after = None
+    server.throttle = None
+    server.errors = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def served_files(http_server):
+    """Yields the directory of synthetic h5 files served by the local HTTP
+    server and the base url the files are served at"""
+
+    yield http_server.served_dir, http_server.base_url
@@ -1,4 +1,9 @@
-from openmc_data_downloader import cross_sections_directory
+import importlib
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+
+from openmc_data_downloader import catalog, cross_sections_directory
 
 
 def test_neutron_isotopes():
@@ -77,3 +82,51 @@ def test_sab():
         )
     )
     assert len(nndc_80_sab_xs_info) == 34
+
+
+def test_catalog_matches_xml_files():
+    """Checks the prebuilt catalog.json is up to date with the bundled xml
+    files, run python -m openmc_data_downloader.catalog to update it"""
+
+    assert catalog.load_catalog() == catalog.build_catalog()
+
+
+def test_import_does_not_parse_xml(monkeypatch):
+    def parse(*args, **kwargs):
+        raise AssertionError("xml files should not be parsed on import")
+
+    monkeypatch.setattr(ET, "parse", parse)
+    importlib.reload(cross_sections_directory)
+
+    assert len(cross_sections_directory.neutron_xs_info) == 1789
+    assert len(cross_sections_directory.ALL_ISOTOPE_OPTIONS) == 631
+
+
+def test_tables_are_built_on_first_use():
+    code = (
+        "from openmc_data_downloader import cross_sections_directory as xs\n"
+        "assert 'neutron_xs_info' not in vars(xs)\n"
+        "assert len(xs.LIB_OPTIONS) == 4\n"
+        "assert 'neutron_xs_info' not in vars(xs)\n"
+        "assert len(xs.neutron_xs_info) == 1789\n"
+        "assert 'neutron_xs_info' in vars(xs)\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_lazy_attributes_available_from_package():
+    import openmc_data_downloader
+
+    assert openmc_data_downloader.SAB_OPTIONS == cross_sections_directory.SAB_OPTIONS
+    assert "Fe" in openmc_data_downloader.ALL_ELEMENT_OPTIONS
+    assert "Fe" in openmc_data_downloader.STABLE_ELEMENT_OPTIONS
+
+
+def test_import_does_not_import_openmc_or_pandas():
+    code = (
+        "import sys\n"
+        "import openmc_data_downloader\n"
+        "assert 'openmc' not in sys.modules\n"
+        "assert 'pandas' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,1161 @@
+import asyncio
+import email.utils
+import errno
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import ssl
+import tarfile
+import threading
+import time
+from http.client import IncompleteRead
+from urllib.error import HTTPError, URLError
+
+import pandas as pd
+import pytest
+
+from openmc_data_downloader import (
+    ConnectionPool,
+    DownloadCache,
+    DownloadReport,
+    FileLock,
+    FileMetrics,
+    LockTimeout,
+    RetryPolicy,
+    StalledDownloadError,
+    configured_mirrors,
+    download_data_frame_cooperatively,
+    download_data_frame_of,
+    download_data_frame_of_async,
+    download_single_file,
+    lock_path_for,
+    parse_mirrors,
+    rank_mirrors,
+    read_manifest,
+    sync_manifest,
+    unpack_cross_section_data,
+    write_bundle,
+    write_manifest,
+)
+from openmc_data_downloader.mirrors import (
+    MIRRORS_ENVIRONMENTAL_VARIABLE,
+    MIRRORS_FILE_ENVIRONMENTAL_VARIABLE,
+)
+from openmc_data_downloader.retries import is_transient
+from openmc_data_downloader.terminal_cmd import JsonLinesFormatter
+from openmc_data_downloader.utils import stream_response_to_file
+
+
+def make_data_frame(base_url, names):
+    return pd.DataFrame.from_dict(
+        {
+            "url": [base_url + name + ".h5" for name in names],
+            "local_file": ["TEST_" + name + ".h5" for name in names],
+        }
+    )
+
+
+def test_download_data_frame_of_keeps_row_order(served_files, tmp_path):
+    served_dir, base_url = served_files
+    names = [f"Fe{number}" for number in range(20)]
+    for name in names:
+        (served_dir / (name + ".h5")).write_bytes(os.urandom(5000))
+
+    local_files = download_data_frame_of(
+        dataframe=make_data_frame(base_url, names),
+        destination=tmp_path / "library",
+        max_workers=8,
+    )
+
+    assert local_files == [tmp_path / "library" / f"TEST_{name}.h5" for name in names]
+    for name, local_file in zip(names, local_files):
+        assert local_file.read_bytes() == (served_dir / (name + ".h5")).read_bytes()
+
+
+def test_download_data_frame_of_continues_after_a_failure(served_files, tmp_path):
+    served_dir, base_url = served_files
+    for name in ["H1", "H2"]:
+        (served_dir / (name + ".h5")).write_bytes(os.urandom(100))
+
+    with pytest.raises(RuntimeError, match="1 of 3 files failed"):
+        download_data_frame_of(
+            dataframe=make_data_frame(base_url, ["H1", "missing", "H2"]),
+            destination=tmp_path / "library",
+            max_workers=1,
+        )
+
+    assert (tmp_path / "library" / "TEST_H1.h5").is_file()
+    assert (tmp_path / "library" / "TEST_H2.h5").is_file()
+
+
+def test_download_data_frame_of_incorrect_max_workers(tmp_path):
+    with pytest.raises(ValueError):
+        download_data_frame_of(
+            dataframe=make_data_frame("http://127.0.0.1/", ["H1"]),
+            destination=tmp_path,
+            max_workers=0,
+        )
+
+
+def test_download_data_frame_of_async_does_not_block_the_loop(served_files, tmp_path):
+    served_dir, base_url = served_files
+    names = [f"Li{number}" for number in range(10)]
+    for name in names:
+        (served_dir / (name + ".h5")).write_bytes(os.urandom(200000))
+
+    async def download_while_ticking():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker = asyncio.ensure_future(tick())
+        local_files = await download_data_frame_of_async(
+            dataframe=make_data_frame(base_url, names),
+            destination=tmp_path / "library",
+            max_workers=3,
+        )
+        ticker.cancel()
+        return local_files, ticks
+
+    local_files, ticks = asyncio.run(download_while_ticking())
+
+    assert local_files == [tmp_path / "library" / f"TEST_{name}.h5" for name in names]
+    assert ticks > 1
+
+
+def test_download_data_frame_of_from_a_running_loop(served_files, tmp_path):
+    served_dir, base_url = served_files
+    (served_dir / "Be9.h5").write_bytes(os.urandom(100))
+
+    async def call_blocking_api():
+        return download_data_frame_of(
+            dataframe=make_data_frame(base_url, ["Be9"]),
+            destination=tmp_path,
+        )
+
+    assert asyncio.run(call_blocking_api()) == [tmp_path / "TEST_Be9.h5"]
+
+
+def test_download_data_frame_of_reuses_connections(served_files, tmp_path):
+    served_dir, base_url = served_files
+    names = [f"C{number}" for number in range(12)]
+    for name in names:
+        (served_dir / (name + ".h5")).write_bytes(os.urandom(1000))
+
+    with ConnectionPool() as pool:
+        download_data_frame_of(
+            dataframe=make_data_frame(base_url, names),
+            destination=tmp_path,
+            max_workers=2,
+            pool=pool,
+        )
+
+    assert pool.opened <= 2
+    assert pool.opened + pool.reused == len(names)
+
+
+def test_connection_pool_reuses_connection_for_same_host(served_files):
+    served_dir, base_url = served_files
+    (served_dir / "O16.h5").write_bytes(b"O16")
+    (served_dir / "O17.h5").write_bytes(b"O17")
+
+    with ConnectionPool() as pool:
+        with pool.urlopen(base_url + "O16.h5") as response:
+            assert response.read() == b"O16"
+        with pool.urlopen(base_url + "O17.h5") as response:
+            assert response.read() == b"O17"
+
+    assert pool.opened == 1
+    assert pool.reused == 1
+
+
+def test_connection_pool_follows_redirects(served_files):
+    served_dir, base_url = served_files
+    (served_dir / "Al27.h5").write_bytes(b"Al27")
+
+    with ConnectionPool() as pool:
+        with pool.urlopen(base_url + "redirect/Al27.h5") as response:
+            assert response.read() == b"Al27"
+
+    assert pool.opened == 1
+    assert pool.reused == 1
+
+
+def test_connection_pool_sends_requests_through_proxy(http_server, monkeypatch):
+    (http_server.served_dir / "Na23.h5").write_bytes(b"Na23")
+    # the local server answers as the proxy for a host that does not exist
+    monkeypatch.setenv("http_proxy", http_server.base_url)
+    monkeypatch.setenv("no_proxy", "")
+
+    with ConnectionPool() as pool:
+        with pool.urlopen("http://files.example.invalid/Na23.h5") as response:
+            assert response.read() == b"Na23"
+
+    assert http_server.requests == [
+        ("GET", "http://files.example.invalid/Na23.h5", None)
+    ]
+
+
+def test_connection_pool_bypasses_proxy_for_no_proxy_hosts(served_files, monkeypatch):
+    served_dir, base_url = served_files
+    (served_dir / "Na23.h5").write_bytes(b"Na23")
+    monkeypatch.setenv("http_proxy", "http://127.0.0.1:9")
+    monkeypatch.setenv("no_proxy", "127.0.0.1")
+
+    with ConnectionPool() as pool:
+        with pool.urlopen(base_url + "Na23.h5") as response:
+            assert response.read() == b"Na23"
+
+
+def test_connection_pool_raises_http_error(served_files):
+    served_dir, base_url = served_files
+
+    with ConnectionPool() as pool:
+        with pytest.raises(HTTPError):
+            with pool.urlopen(base_url + "missing.h5"):
+                pass
+
+
+def test_download_single_file_resumes_interrupted_download(http_server, tmp_path):
+    data = os.urandom(100000)
+    (http_server.served_dir / "U235.h5").write_bytes(data)
+    http_server.interrupt_after = 30000
+
+    local_path = download_single_file(
+        url=http_server.base_url + "U235.h5", destination=tmp_path
+    )
+
+    assert local_path.read_bytes() == data
+    assert not (tmp_path / "U235.h5.part").exists()
+    assert http_server.requests[-1] == ("GET", "/U235.h5", "bytes=30000-")
+
+
+def test_download_single_file_resumes_after_process_is_killed(http_server, tmp_path):
+    data = os.urandom(300_000)
+    (http_server.served_dir / "U233.h5").write_bytes(data)
+    # the first response trickles after 100 kB so the process is killed mid
+    # transfer
+    http_server.throttle = (100_000, 0.01)
+    part_path = tmp_path / "U233.h5.part"
+
+    process = multiprocessing.get_context("spawn").Process(
+        target=download_single_file,
+        # a small buffer so the first bytes reach the file straight away
+        kwargs={
+            "url": http_server.base_url + "U233.h5",
+            "destination": tmp_path,
+            "buffer_size": 16384,
+        },
+    )
+    process.start()
+    deadline = time.monotonic() + 30
+    while not (part_path.is_file() and part_path.stat().st_size >= 64_000):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    process.kill()
+    process.join(timeout=30)
+
+    written = part_path.stat().st_size
+    assert 64_000 <= written < len(data)
+    assert part_path.read_bytes() == data[:written]
+
+    local_path = download_single_file(
+        url=http_server.base_url + "U233.h5", destination=tmp_path
+    )
+
+    assert local_path.read_bytes() == data
+    assert http_server.requests[-1] == ("GET", "/U233.h5", f"bytes={written}-")
+
+
+def test_download_single_file_resumes_left_over_part_file(http_server, tmp_path):
+    data = os.urandom(50000)
+    (http_server.served_dir / "U238.h5").write_bytes(data)
+    (tmp_path / "U238.h5.part").write_bytes(data[:20000])
+
+    local_path = download_single_file(
+        url=http_server.base_url + "U238.h5", destination=tmp_path, overwrite=False
+    )
+
+    assert local_path.read_bytes() == data
+    assert http_server.requests == [("GET", "/U238.h5", "bytes=20000-")]
+
+
+def test_download_single_file_restarts_oversized_part_file(http_server, tmp_path):
+    data = os.urandom(1000)
+    (http_server.served_dir / "Pu239.h5").write_bytes(data)
+    (tmp_path / "Pu239.h5.part").write_bytes(os.urandom(2000))
+
+    local_path = download_single_file(
+        url=http_server.base_url + "Pu239.h5", destination=tmp_path
+    )
+
+    assert local_path.read_bytes() == data
+
+
+class RecordingRetryPolicy(RetryPolicy):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.delays = []
+
+    def delay(self, attempt, error=None):
+        self.delays.append(super().delay(attempt, error))
+        return self.delays[-1]
+
+
+def test_download_single_file_retries_after_rate_limiting(http_server, tmp_path):
+    (http_server.served_dir / "Li6.h5").write_bytes(b"Li6 data")
+    http_server.errors = [(429, {"Retry-After": "0"}), (503, {})]
+    policy = RecordingRetryPolicy(backoff=0.01)
+
+    local_path = download_single_file(
+        url=http_server.base_url + "Li6.h5", destination=tmp_path, retry_policy=policy
+    )
+
+    assert local_path.read_bytes() == b"Li6 data"
+    assert len(http_server.requests) == 3
+    assert policy.delays[0] == 0
+    assert 0 <= policy.delays[1] <= 0.02
+
+
+def test_download_single_file_does_not_retry_missing_file(http_server, tmp_path):
+    with pytest.raises(HTTPError):
+        download_single_file(
+            url=http_server.base_url + "missing.h5", destination=tmp_path
+        )
+
+    assert len(http_server.requests) == 1
+
+
+def test_download_single_file_gives_up_after_tries(http_server, tmp_path):
+    (http_server.served_dir / "Li6.h5").write_bytes(b"Li6 data")
+    http_server.errors = [(500, {})] * 3
+
+    with pytest.raises(HTTPError):
+        download_single_file(
+            url=http_server.base_url + "Li6.h5",
+            destination=tmp_path,
+            retry_policy=RetryPolicy(tries=2, backoff=0),
+        )
+
+    assert len(http_server.requests) == 2
+
+
+def test_retry_policy_delay_backs_off_and_honours_retry_after():
+    policy = RetryPolicy(backoff=1, max_delay=5, max_retry_after=30, jitter=False)
+    assert [policy.delay(attempt) for attempt in range(1, 6)] == [1, 2, 4, 5, 5]
+
+    jittered = RetryPolicy(backoff=1, max_delay=5)
+    assert all(0 <= jittered.delay(3) <= 4 for _ in range(100))
+
+    def rate_limited(retry_after):
+        headers = {"Retry-After": retry_after}
+        return HTTPError("https://github.com", 429, "Too Many Requests", headers, None)
+
+    assert policy.delay(1, rate_limited("12")) == 12
+    assert policy.delay(1, rate_limited("3600")) == 30
+    in_ten_seconds = email.utils.formatdate(time.time() + 10, usegmt=True)
+    assert 8 <= policy.delay(1, rate_limited(in_ten_seconds)) <= 10
+
+
+def test_is_transient():
+    assert is_transient(HTTPError("https://github.com", 503, "", {}, None))
+    assert not is_transient(HTTPError("https://github.com", 404, "", {}, None))
+    assert is_transient(URLError(ConnectionRefusedError()))
+    assert is_transient(URLError(socket.timeout()))
+    assert not is_transient(URLError(FileNotFoundError()))
+    assert not is_transient(URLError(ssl.SSLCertVerificationError()))
+    assert not is_transient(ssl.SSLCertVerificationError())
+    assert is_transient(URLError(ssl.SSLEOFError()))
+    assert is_transient(socket.gaierror(socket.EAI_AGAIN, "temporary failure"))
+    assert is_transient(OSError(errno.ENETUNREACH, "Network is unreachable"))
+    assert is_transient(OSError(errno.EHOSTUNREACH, "No route to host"))
+    assert not is_transient(OSError(errno.ENOENT, "No such file"))
+    assert is_transient(ConnectionResetError())
+    assert is_transient(IncompleteRead(b""))
+    assert is_transient(StalledDownloadError())
+    assert not is_transient(ValueError())
+
+
+class SlowResponse(io.BytesIO):
+    # each receive from a slow connection returns a few bytes
+    def readinto1(self, buffer):
+        time.sleep(0.01)
+        return super().readinto(buffer[:16])
+
+
+def test_stream_response_to_file_aborts_below_min_throughput():
+    fh = io.BytesIO()
+    with pytest.raises(StalledDownloadError):
+        stream_response_to_file(
+            SlowResponse(bytes(4096)), fh, min_throughput=10000, stall_window=0.05
+        )
+    # the bytes received before the abort are kept
+    assert 0 < len(fh.getvalue()) < 4096
+
+    fh = io.BytesIO()
+    stream_response_to_file(SlowResponse(bytes(256)), fh, stall_window=0.05)
+    assert fh.getvalue() == bytes(256)
+
+
+def test_download_single_file_resumes_after_stall(http_server, tmp_path):
+    data = os.urandom(200_000)
+    (http_server.served_dir / "Li7.h5").write_bytes(data)
+    # 100 kB quickly and then about 1.6 kB/s, which would take a minute
+    http_server.throttle = (100_000, 0.01)
+    metrics = FileMetrics(http_server.base_url + "Li7.h5", "Li7.h5")
+
+    start = time.perf_counter()
+    local_path = download_single_file(
+        url=http_server.base_url + "Li7.h5",
+        destination=tmp_path,
+        metrics=metrics,
+        retry_policy=RetryPolicy(backoff=0, min_throughput=100000, stall_window=0.2),
+    )
+
+    assert time.perf_counter() - start < 10
+    assert local_path.read_bytes() == data
+    assert metrics.stalls == 1
+    assert metrics.retries == 1
+    assert metrics.bytes == len(data)
+    resumed_from = int(http_server.requests[-1][2][len("bytes=") : -1])
+    assert resumed_from >= 100_000
+
+
+def test_download_single_file_in_segments_resumes_after_stall(http_server, tmp_path):
+    data = os.urandom(100001)
+    (http_server.served_dir / "Th232.h5").write_bytes(data)
+    metrics = FileMetrics(http_server.base_url + "Th232.h5", "Th232.h5")
+    policy = RetryPolicy(backoff=0, min_throughput=100000, stall_window=0.1)
+    # only the first range requested is throttled
+    http_server.throttle = (1024, 0.01)
+
+    local_path = download_single_file(
+        url=http_server.base_url + "Th232.h5",
+        destination=tmp_path,
+        segment_threshold=50000,
+        segments=2,
+        metrics=metrics,
+        retry_policy=policy,
+    )
+
+    assert local_path.read_bytes() == data
+    assert metrics.stalls == 1
+    assert metrics.bytes == len(data)
+    ranges = [r for method, _, r in http_server.requests if method == "GET"]
+    assert len(ranges) == 3
+    # the stalled range is requested again from the bytes already written
+    resumed = set(ranges) - {"bytes=0-49999", "bytes=50000-100000"}
+    assert len(resumed) == 1
+
+
+def test_head_requests_are_retried(http_server, tmp_path):
+    data = os.urandom(100001)
+    (http_server.served_dir / "Th230.h5").write_bytes(data)
+    http_server.errors = [(503, {})]
+
+    local_path = download_single_file(
+        url=http_server.base_url + "Th230.h5",
+        destination=tmp_path,
+        segment_threshold=50000,
+        segments=2,
+        retry_policy=RetryPolicy(backoff=0),
+    )
+
+    assert local_path.read_bytes() == data
+    methods = [method for method, _, _ in http_server.requests]
+    # the file is still downloaded in segments after the HEAD request failed
+    assert methods == ["HEAD", "HEAD", "GET", "GET"]
+
+    http_server.errors = [(503, {})]
+    with ConnectionPool() as pool:
+        assert rank_mirrors(
+            [http_server.base_url + "Th230.h5"],
+            pool,
+            retry_policy=RetryPolicy(backoff=0),
+        ) == [http_server.base_url + "Th230.h5"]
+    assert [method for method, _, _ in http_server.requests[4:]] == ["HEAD", "HEAD"]
+
+
+def test_download_single_file_in_segments(http_server, tmp_path):
+    data = os.urandom(100001)
+    (http_server.served_dir / "Th232.h5").write_bytes(data)
+
+    local_path = download_single_file(
+        url=http_server.base_url + "Th232.h5",
+        destination=tmp_path,
+        segment_threshold=50000,
+        segments=3,
+    )
+
+    assert local_path.read_bytes() == data
+    assert not (tmp_path / "Th232.h5.segmented.part").exists()
+    ranges = sorted(r for method, _, r in http_server.requests if method == "GET")
+    assert ranges == ["bytes=0-33332", "bytes=33333-66666", "bytes=66667-100000"]
+
+
+def test_download_single_file_below_segment_threshold(http_server, tmp_path):
+    data = os.urandom(1000)
+    (http_server.served_dir / "Th230.h5").write_bytes(data)
+
+    local_path = download_single_file(
+        url=http_server.base_url + "Th230.h5",
+        destination=tmp_path,
+        segment_threshold=50000,
+    )
+
+    assert local_path.read_bytes() == data
+    assert [r for method, _, r in http_server.requests if method == "GET"] == [None]
+
+
+def test_download_data_frame_of_fills_new_destinations_from_cache(
+    http_server, tmp_path
+):
+    names = ["Fe56", "Fe57"]
+    for name in names:
+        (http_server.served_dir / (name + ".h5")).write_bytes(os.urandom(3000))
+    dataframe = make_data_frame(http_server.base_url, names)
+    dataframe["library"] = "TEST"
+    dataframe["remote_file"] = [name + ".h5" for name in names]
+    cache = DownloadCache(tmp_path / "cache", link_mode="hardlink")
+
+    first = download_data_frame_of(dataframe, tmp_path / "first", cache=cache)
+    requests_after_first = len(http_server.requests)
+    second = download_data_frame_of(dataframe, tmp_path / "second", cache=cache)
+
+    assert len(http_server.requests) == requests_after_first
+    for first_file, second_file in zip(first, second):
+        assert first_file.read_bytes() == second_file.read_bytes()
+        assert os.path.samefile(first_file, second_file)
+    assert cache.lookup("TEST/Fe56.h5") is not None
+
+
+def test_download_single_file_uses_cache_from_environmental_variable(
+    http_server, tmp_path, monkeypatch
+):
+    (http_server.served_dir / "B10.h5").write_bytes(b"B10")
+    monkeypatch.setenv("OPENMC_DATA_DOWNLOADER_CACHE", str(tmp_path / "cache"))
+
+    for destination in ["first", "second"]:
+        download_single_file(
+            url=http_server.base_url + "B10.h5",
+            destination=tmp_path / destination,
+        )
+
+    assert len(http_server.requests) == 1
+    assert (tmp_path / "second" / "B10.h5").read_bytes() == b"B10"
+
+
+def test_download_single_file_cache_true_and_false(http_server, tmp_path, monkeypatch):
+    (http_server.served_dir / "B11.h5").write_bytes(b"B11")
+    monkeypatch.setenv("OPENMC_DATA_DOWNLOADER_CACHE", str(tmp_path / "cache"))
+
+    for destination in ["first", "second"]:
+        download_single_file(
+            url=http_server.base_url + "B11.h5",
+            destination=tmp_path / destination,
+            cache=True,
+        )
+    assert len(http_server.requests) == 1
+
+    download_single_file(
+        url=http_server.base_url + "B11.h5", destination=tmp_path / "third", cache=False
+    )
+    assert len(http_server.requests) == 2
+    assert (tmp_path / "third" / "B11.h5").read_bytes() == b"B11"
+
+    monkeypatch.delenv("OPENMC_DATA_DOWNLOADER_CACHE")
+    with pytest.raises(ValueError):
+        download_single_file(
+            url=http_server.base_url + "B11.h5", destination=tmp_path, cache=True
+        )
+
+
+def test_download_cache_symlink_and_verify(tmp_path):
+    downloaded = tmp_path / "B11.h5"
+    downloaded.write_bytes(b"B11")
+    cache = DownloadCache(tmp_path / "cache", link_mode="symlink", verify=True)
+    cache.store("TEST/B11.h5", downloaded)
+
+    assert cache.link("TEST/B11.h5", tmp_path / "linked.h5")
+    assert (tmp_path / "linked.h5").is_symlink()
+    assert not cache.link("TEST/missing.h5", tmp_path / "missing.h5")
+
+    cache.lookup("TEST/B11.h5").write_bytes(b"B12")
+    assert cache.lookup("TEST/B11.h5") is None
+
+
+def test_download_cache_incorrect_link_mode(tmp_path):
+    with pytest.raises(ValueError):
+        DownloadCache(tmp_path, link_mode="teleport")
+
+
+def test_download_data_frame_of_reports_each_file(http_server, tmp_path):
+    data = os.urandom(100000)
+    (http_server.served_dir / "Li6.h5").write_bytes(data)
+    (tmp_path / "TEST_Li7.h5").write_bytes(b"already downloaded")
+    http_server.interrupt_after = 30000
+    report = DownloadReport()
+    finished = []
+
+    with pytest.raises(RuntimeError):
+        download_data_frame_of(
+            make_data_frame(http_server.base_url, ["Li6", "Li7", "missing"]),
+            destination=tmp_path,
+            overwrite=False,
+            report=report,
+            report_file=tmp_path / "report.json",
+            progress=lambda metrics, report: finished.append(metrics.local_file),
+        )
+
+    downloaded, skipped, failed = report.files
+    assert downloaded.status == "downloaded"
+    assert downloaded.source_url == http_server.base_url + "Li6.h5"
+    assert downloaded.bytes == len(data)
+    assert downloaded.retries == 1
+    assert downloaded.seconds > 0
+    assert skipped.status == "skipped"
+    assert skipped.bytes == 0
+    assert failed.status == "failed"
+    assert "404" in failed.error
+    assert sorted(finished) == ["TEST_Li6.h5", "TEST_Li7.h5", "TEST_missing.h5"]
+
+    summary = json.loads((tmp_path / "report.json").read_text())["summary"]
+    assert summary["files"] == 3
+    assert (summary["downloaded"], summary["skipped"], summary["failed"]) == (1, 1, 1)
+    assert summary["bytes"] == len(data)
+    assert summary["file_seconds"]["p50"] == downloaded.seconds
+
+
+def test_download_report_of_cached_and_segmented_files(http_server, tmp_path):
+    data = os.urandom(100000)
+    (http_server.served_dir / "Fe56.h5").write_bytes(data)
+    cache = DownloadCache(tmp_path / "cache")
+    report = DownloadReport()
+
+    for destination in ["first", "second"]:
+        download_data_frame_of(
+            make_data_frame(http_server.base_url, ["Fe56"]),
+            destination=tmp_path / destination,
+            cache=cache,
+            segment_threshold=1000,
+            segments=4,
+            report=report,
+        )
+
+    assert [metrics.status for metrics in report.files] == ["downloaded", "cached"]
+    assert [metrics.bytes for metrics in report.files] == [len(data), 0]
+    assert report.summary()["connections_opened"] >= 1
+
+
+def test_download_single_file_logs_outcome(served_files, tmp_path, caplog):
+    served_dir, base_url = served_files
+    (served_dir / "Li6.h5").write_bytes(b"Li6 data")
+
+    with caplog.at_level(logging.INFO, logger="openmc_data_downloader"):
+        download_single_file(base_url + "Li6.h5", destination=tmp_path)
+        download_single_file(base_url + "Li6.h5", destination=tmp_path, overwrite=False)
+
+    assert [record.getMessage() for record in caplog.records] == [
+        f"Downloading {tmp_path / 'Li6.h5'}",
+        f"Skipping {tmp_path / 'Li6.h5'}, already downloaded",
+    ]
+
+
+def test_json_lines_formatter():
+    record = logging.LogRecord(
+        "openmc_data_downloader.utils",
+        logging.INFO,
+        __file__,
+        1,
+        "Downloading %s",
+        ("Li6.h5",),
+        None,
+    )
+
+    entry = json.loads(JsonLinesFormatter().format(record))
+
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "openmc_data_downloader.utils"
+    assert entry["message"] == "Downloading Li6.h5"
+
+
+def make_plan_records(base_url, isotopes):
+    return [
+        {
+            "library": "TENDL-2019",
+            "remote_file": f"{isotope}.h5",
+            "url": f"{base_url}{isotope}.h5",
+            "local_file": f"TENDL-2019_{isotope}.h5",
+            "particle": "neutron",
+            "isotope": isotope,
+            "element": isotope.rstrip("0123456789"),
+            "sab": float("nan"),
+            "priority": 1,
+        }
+        for isotope in isotopes
+    ]
+
+
+def test_write_manifest_records_size_and_checksum(served_files, tmp_path):
+    served_dir, base_url = served_files
+    (served_dir / "Li6.h5").write_bytes(b"Li6 data")
+    records = make_plan_records(base_url, ["Li6"])
+    download_data_frame_of(pd.DataFrame(records), destination=tmp_path / "library")
+
+    manifest = write_manifest(records, tmp_path / "library", tmp_path / "manifest.json")
+
+    [entry] = read_manifest(manifest)
+    assert entry["local_file"] == "TENDL-2019_Li6.h5"
+    assert entry["size"] == 8
+    assert entry["sha256"] == hashlib.sha256(b"Li6 data").hexdigest()
+    assert "sab" not in entry
+
+
+def test_sync_manifest_only_fetches_and_removes_differences(http_server, tmp_path):
+    served_dir, base_url = http_server.served_dir, http_server.base_url
+    for isotope in ["Li6", "Li7", "Be9"]:
+        (served_dir / f"{isotope}.h5").write_bytes(os.urandom(1000))
+    records = make_plan_records(base_url, ["Li6", "Li7", "Be9"])
+    download_data_frame_of(pd.DataFrame(records), destination=tmp_path / "first")
+    manifest = write_manifest(records, tmp_path / "first", tmp_path / "manifest.json")
+
+    destination = tmp_path / "second"
+    sync_manifest(manifest, destination)
+    for isotope in ["Li6", "Li7", "Be9"]:
+        assert (destination / f"TENDL-2019_{isotope}.h5").read_bytes() == (
+            served_dir / f"{isotope}.h5"
+        ).read_bytes()
+    assert (destination / "cross_sections.xml").is_file()
+
+    (destination / "TENDL-2019_Li7.h5").unlink()
+    (destination / "TENDL-2019_Fe56.h5").write_bytes(b"not in the manifest")
+    (destination / "notes.h5").write_bytes(b"not a download")
+    http_server.requests.clear()
+
+    sync_manifest(manifest, destination)
+
+    assert [path for method, path, _ in http_server.requests] == ["/Li7.h5"]
+    assert (destination / "TENDL-2019_Li7.h5").is_file()
+    assert not (destination / "TENDL-2019_Fe56.h5").exists()
+    assert (destination / "notes.h5").is_file()
+
+    http_server.requests.clear()
+    sync_manifest(manifest, destination)
+    assert http_server.requests == []
+
+
+@pytest.mark.parametrize("mode", ["fcntl", "exclusive"])
+def test_download_single_file_waits_for_another_process(http_server, tmp_path, mode):
+    (http_server.served_dir / "Fe56.h5").write_bytes(b"from the server")
+    local_path = tmp_path / "library" / "Fe56.h5"
+    local_path.parent.mkdir()
+
+    with FileLock(lock_path_for(local_path), mode=mode):
+        process = multiprocessing.get_context("spawn").Process(
+            target=download_single_file,
+            kwargs={
+                "url": http_server.base_url + "Fe56.h5",
+                "destination": local_path.parent,
+                "overwrite": True,
+                "lock_mode": mode,
+            },
+        )
+        process.start()
+        time.sleep(1)
+        assert process.is_alive()
+        # this process finishes the file while the other waits for the lock
+        local_path.write_bytes(b"from another process")
+
+    process.join(timeout=30)
+
+    assert process.exitcode == 0
+    assert local_path.read_bytes() == b"from another process"
+    assert http_server.requests == []
+    assert not lock_path_for(local_path).exists()
+
+
+def test_download_single_file_lock_timeout(http_server, tmp_path):
+    (http_server.served_dir / "Fe56.h5").write_bytes(b"from the server")
+
+    with FileLock(lock_path_for(tmp_path / "Fe56.h5")):
+        with pytest.raises(LockTimeout):
+            download_single_file(
+                url=http_server.base_url + "Fe56.h5",
+                destination=tmp_path,
+                lock_timeout=0.3,
+            )
+
+    download_single_file(url=http_server.base_url + "Fe56.h5", destination=tmp_path)
+    assert (tmp_path / "Fe56.h5").read_bytes() == b"from the server"
+
+
+def test_file_lock_takes_over_stale_lock_file(tmp_path):
+    lock_path = tmp_path / ".Fe56.h5.lock"
+    lock_path.write_text("a process that died")
+    os.utime(lock_path, (time.time() - 120, time.time() - 120))
+
+    with FileLock(lock_path, timeout=1, stale_after=60, mode="exclusive") as lock:
+        assert lock.waited
+        with pytest.raises(TimeoutError):
+            FileLock(lock_path, timeout=0.2, mode="exclusive").acquire()
+
+    assert not lock_path.exists()
+
+
+def test_download_single_file_stale_lock_timeout(http_server, tmp_path):
+    (http_server.served_dir / "Fe56.h5").write_bytes(b"from the server")
+    lock_path = lock_path_for(tmp_path / "Fe56.h5")
+    lock_path.write_text("a process that died")
+    # older than NFS attribute caching but not older than the default
+    os.utime(lock_path, (time.time() - 120, time.time() - 120))
+
+    with pytest.raises(LockTimeout):
+        download_single_file(
+            url=http_server.base_url + "Fe56.h5",
+            destination=tmp_path,
+            lock_mode="exclusive",
+            lock_timeout=0.3,
+        )
+
+    download_single_file(
+        url=http_server.base_url + "Fe56.h5",
+        destination=tmp_path,
+        lock_mode="exclusive",
+        lock_timeout=0.3,
+        stale_lock_timeout=60,
+    )
+    assert (tmp_path / "Fe56.h5").read_bytes() == b"from the server"
+
+    with pytest.raises(ValueError, match="stale_after must be greater than 0"):
+        FileLock(lock_path, stale_after=0)
+
+
+def test_download_data_frame_cooperatively_downloads_each_file_once(
+    http_server, tmp_path
+):
+    names = [f"Fe{number}" for number in range(24)]
+    for name in names:
+        (http_server.served_dir / (name + ".h5")).write_bytes(os.urandom(200_000))
+    dataframe = make_data_frame(http_server.base_url, names)
+    destination = tmp_path / "library"
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=download_data_frame_cooperatively,
+            kwargs={
+                "dataframe": dataframe,
+                "destination": destination,
+                "partition": (index, 4),
+                "max_workers": 2,
+            },
+        )
+        for index in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+
+    assert [process.exitcode for process in processes] == [0, 0, 0, 0]
+    for name in names:
+        assert (destination / f"TEST_{name}.h5").read_bytes() == (
+            http_server.served_dir / (name + ".h5")
+        ).read_bytes()
+    requested = sorted(path for method, path, _ in http_server.requests)
+    assert requested == sorted(f"/{name}.h5" for name in names)
+
+
+def test_download_data_frame_cooperatively_waits_for_claimed_files(
+    http_server, tmp_path
+):
+    names = ["H1", "H2"]
+    for name in names:
+        (http_server.served_dir / (name + ".h5")).write_bytes(b"from the server")
+    destination = tmp_path / "library"
+    destination.mkdir()
+
+    # another worker has claimed H1 and fails to download it
+    lock = FileLock(lock_path_for(destination / "TEST_H1.h5"))
+    lock.acquire()
+    threading.Timer(0.5, lock.release).start()
+
+    local_files = download_data_frame_cooperatively(
+        dataframe=make_data_frame(http_server.base_url, names),
+        destination=destination,
+        partition=(1, 2),
+    )
+
+    assert local_files == [destination / "TEST_H1.h5", destination / "TEST_H2.h5"]
+    assert (destination / "TEST_H1.h5").read_bytes() == b"from the server"
+
+
+def test_download_data_frame_cooperatively_network_timeout_is_not_a_claim(
+    tmp_path,
+):
+    # a server that accepts connections and never responds
+    listener = socket.create_server(("127.0.0.1", 0))
+    connections = []
+
+    def accept():
+        while True:
+            try:
+                connections.append(listener.accept()[0])
+            except OSError:
+                return
+
+    threading.Thread(target=accept, daemon=True).start()
+    base_url = f"http://127.0.0.1:{listener.getsockname()[1]}/"
+    finished = []
+
+    try:
+        with pytest.raises(RuntimeError):
+            download_data_frame_cooperatively(
+                dataframe=make_data_frame(base_url, ["H1"]),
+                destination=tmp_path,
+                partition=(0, 1),
+                retry_policy=RetryPolicy(tries=1, timeout=0.5),
+                progress=lambda metrics, report: finished.append(metrics.status),
+            )
+    finally:
+        listener.close()
+        for connection in connections:
+            connection.close()
+
+    assert finished == ["failed"]
+    assert len(connections) == 1
+
+
+def test_download_data_frame_cooperatively_incorrect_partition(tmp_path):
+    with pytest.raises(ValueError):
+        download_data_frame_cooperatively(
+            dataframe=make_data_frame("http://127.0.0.1/", ["H1"]),
+            destination=tmp_path,
+            partition=(2, 2),
+        )
+
+
+def test_unpack_cross_section_data_extracts_bundle_and_writes_xml(
+    served_files, tmp_path
+):
+    served_dir, base_url = served_files
+    for isotope in ["Li6", "Li7"]:
+        (served_dir / f"{isotope}.h5").write_bytes(os.urandom(1000))
+    records = make_plan_records(base_url, ["Li6", "Li7"])
+    download_data_frame_of(pd.DataFrame(records), destination=tmp_path / "first")
+
+    archive = write_bundle(records, tmp_path / "first", tmp_path / "bundle.tar.gz")
+    cross_sections_xml = unpack_cross_section_data(archive, tmp_path / "second")
+
+    for isotope in ["Li6", "Li7"]:
+        assert (tmp_path / "second" / f"TENDL-2019_{isotope}.h5").read_bytes() == (
+            served_dir / f"{isotope}.h5"
+        ).read_bytes()
+    xml = open(cross_sections_xml).read()
+    assert 'materials="Li6" path="TENDL-2019_Li6.h5"' in xml
+    assert 'materials="Li7" path="TENDL-2019_Li7.h5"' in xml
+    assert sorted(path.name for path in (tmp_path / "second").iterdir()) == [
+        "TENDL-2019_Li6.h5",
+        "TENDL-2019_Li7.h5",
+        "cross_sections.xml",
+    ]
+
+
+def test_unpack_cross_section_data_rejects_damaged_bundle(served_files, tmp_path):
+    served_dir, base_url = served_files
+    (served_dir / "Li6.h5").write_bytes(b"Li6 data")
+    records = make_plan_records(base_url, ["Li6"])
+    download_data_frame_of(pd.DataFrame(records), destination=tmp_path / "first")
+    archive = write_bundle(records, tmp_path / "first", tmp_path / "bundle.tar")
+
+    # a file changed after the bundle was packed no longer matches the manifest
+    with tarfile.open(archive) as tar:
+        manifest = tar.extractfile("manifest.json").read()
+    with tarfile.open(tmp_path / "damaged.tar", "w") as tar:
+        for name, data in [
+            ("manifest.json", manifest),
+            ("TENDL-2019_Li6.h5", b"Li6 date"),
+        ]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    with pytest.raises(RuntimeError):
+        unpack_cross_section_data(tmp_path / "damaged.tar", tmp_path / "second")
+    assert not (tmp_path / "second" / "TENDL-2019_Li6.h5").exists()
+
+    with pytest.raises(ValueError):
+        unpack_cross_section_data(tmp_path / "first" / "TENDL-2019_Li6.h5", tmp_path)
+
+
+@pytest.mark.parametrize("name", ["../escaped.h5", "sub/../../escaped.h5", ".."])
+def test_unpack_cross_section_data_rejects_paths_outside_destination(tmp_path, name):
+    data = b"escaped"
+    manifest = json.dumps(
+        {
+            "version": 1,
+            "files": [
+                {
+                    "library": "TENDL-2019",
+                    "url": "https://github.com/escaped.h5",
+                    "local_file": name,
+                    "size": len(data),
+                    "sha256": hashlib.sha256(data).hexdigest(),
+                }
+            ],
+        }
+    ).encode()
+    with tarfile.open(tmp_path / "crafted.tar", "w") as tar:
+        for member, content in [("manifest.json", manifest), (name, data)]:
+            info = tarfile.TarInfo(member)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+    destination = tmp_path / "destination"
+    with pytest.raises(ValueError):
+        unpack_cross_section_data(tmp_path / "crafted.tar", destination)
+    assert not (tmp_path / "escaped.h5").exists()
+    assert list(destination.iterdir()) == []
+
+
+def make_github_records(isotopes):
+    # the urls of the real repository, which is never reached when a mirror
+    # has the files
+    return make_plan_records(
+        "https://github.com/openmc-data-storage/TENDL-2019/raw/main/h5_files/",
+        isotopes,
+    )
+
+
+def test_download_data_frame_of_from_local_folder_mirror(tmp_path):
+    mirror = tmp_path / "mirror"
+    (mirror / "h5_files").mkdir(parents=True)
+    (mirror / "h5_files" / "Li6.h5").write_bytes(b"Li6 data")
+
+    [local_file] = download_data_frame_of(
+        pd.DataFrame(make_github_records(["Li6"])),
+        destination=tmp_path / "library",
+        mirrors={"TENDL-2019": [str(mirror)]},
+    )
+
+    assert local_file.read_bytes() == b"Li6 data"
+
+
+def test_download_data_frame_of_ranks_mirrors(http_server, tmp_path):
+    (http_server.served_dir / "h5_files").mkdir()
+    for isotope in ["Li6", "Li7"]:
+        (http_server.served_dir / "h5_files" / f"{isotope}.h5").write_bytes(b"data")
+    dead_mirror = "http://127.0.0.1:1/"
+
+    local_files = download_data_frame_of(
+        pd.DataFrame(make_github_records(["Li6", "Li7"])),
+        destination=tmp_path / "library",
+        mirrors={"*": [dead_mirror, http_server.base_url]},
+        retry_policy=RetryPolicy(backoff=0),
+    )
+
+    assert [path.read_bytes() for path in local_files] == [b"data", b"data"]
+    # the mirror is probed once for the library and each file is then only
+    # requested from it
+    assert [method for method, _, _ in http_server.requests].count("HEAD") == 1
+    assert [method for method, _, _ in http_server.requests].count("GET") == 2
+
+
+def test_download_data_frame_of_falls_back_to_the_next_mirror(http_server, tmp_path):
+    first_mirror = tmp_path / "first_mirror"
+    (first_mirror / "h5_files").mkdir(parents=True)
+    (first_mirror / "h5_files" / "Li6.h5").write_bytes(b"Li6 first mirror")
+    (http_server.served_dir / "h5_files").mkdir()
+    (http_server.served_dir / "h5_files" / "Li7.h5").write_bytes(b"Li7 second mirror")
+
+    local_files = download_data_frame_of(
+        pd.DataFrame(make_github_records(["Li6", "Li7"])),
+        destination=tmp_path / "library",
+        mirrors={"TENDL-2019": [str(first_mirror), http_server.base_url]},
+    )
+
+    assert [path.read_bytes() for path in local_files] == [
+        b"Li6 first mirror",
+        b"Li7 second mirror",
+    ]
+
+
+def test_download_data_frame_of_only_probes_mirrors_for_downloads(
+    http_server, tmp_path
+):
+    (http_server.served_dir / "h5_files").mkdir()
+    (http_server.served_dir / "h5_files" / "Li6.h5").write_bytes(b"Li6")
+    dataframe = pd.DataFrame(make_github_records(["Li6"]))
+    mirrors = {"*": [http_server.base_url]}
+
+    download_data_frame_of(dataframe, destination=tmp_path, mirrors=mirrors)
+    requests = len(http_server.requests)
+    download_data_frame_of(
+        dataframe, destination=tmp_path, overwrite=False, mirrors=mirrors
+    )
+
+    assert requests == 2
+    assert len(http_server.requests) == requests
+
+
+def test_download_data_frame_of_skips_unavailable_mirrors(http_server, tmp_path):
+    # the origin is also served by the local server in the layout of GitHub
+    origin = http_server.served_dir / "TENDL-2019" / "raw" / "main" / "h5_files"
+    origin.mkdir(parents=True)
+    (http_server.served_dir / "mirror" / "h5_files").mkdir(parents=True)
+    for isotope in ["Li6", "Li7"]:
+        (origin / f"{isotope}.h5").write_bytes(b"origin")
+    (http_server.served_dir / "mirror" / "h5_files" / "Li6.h5").write_bytes(b"mirror")
+    records = make_plan_records(
+        http_server.base_url + "TENDL-2019/raw/main/h5_files/", ["Li6", "Li7"]
+    )
+    report = DownloadReport()
+
+    download_data_frame_of(
+        pd.DataFrame(records),
+        destination=tmp_path,
+        mirrors={"*": ["http://127.0.0.1:1/", http_server.base_url + "mirror/"]},
+        retry_policy=RetryPolicy(backoff=0),
+        report=report,
+    )
+
+    assert (tmp_path / "TENDL-2019_Li6.h5").read_bytes() == b"mirror"
+    assert (tmp_path / "TENDL-2019_Li7.h5").read_bytes() == b"origin"
+    # the file missing from the mirror comes from the origin without trying
+    # the mirror that failed to answer
+    assert [metrics.retries for metrics in report.files] == [0, 0]
+
+
+def test_parse_mirrors_and_environmental_variable(monkeypatch):
+    assert parse_mirrors(
+        "TENDL-2019=https://a.example.com/,/data/tendl; https://b.example.com/{library}"
+    ) == {
+        "TENDL-2019": ["https://a.example.com/", "/data/tendl"],
+        "*": ["https://b.example.com/{library}"],
+    }
+
+    monkeypatch.setenv(
+        MIRRORS_ENVIRONMENTAL_VARIABLE, "FENDL-3.1d=https://c.example.com"
+    )
+    assert configured_mirrors() == {"FENDL-3.1d": ["https://c.example.com"]}
+    assert configured_mirrors({}) == {}
+
+
+def test_configured_mirrors_from_default_file_in_home(tmp_path, monkeypatch):
+    monkeypatch.delenv(MIRRORS_ENVIRONMENTAL_VARIABLE, raising=False)
+    monkeypatch.delenv(MIRRORS_FILE_ENVIRONMENTAL_VARIABLE, raising=False)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    assert configured_mirrors() == {}
+
+    mirrors_file = tmp_path / ".config" / "openmc_data_downloader" / "mirrors.json"
+    mirrors_file.parent.mkdir(parents=True)
+    mirrors_file.write_text(json.dumps({"*": ["https://d.example.com/"]}))
+    assert configured_mirrors() == {"*": ["https://d.example.com/"]}
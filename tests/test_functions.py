@@ -4,18 +4,25 @@ __author__ = "Jonathan Shimwell"
 
 
 import os
+import subprocess
+import sys
 import unittest
 import time
 import pytest
 
+import xml.etree.ElementTree as ET
+
 import openmc
 import pandas as pd
 from openmc_data_downloader import (
+    create_cross_sections_xml,
     expand_materials_to_isotopes,
     identify_isotopes_to_download,
     identify_sabs_to_download,
+    identify_to_download,
     expand_materials_to_sabs,
     download_single_file,
+    expand_materials,
 )
 
 
@@ -138,6 +145,82 @@ def test_identify_isotopes_to_download_all():
     assert len(filtered_df.values) == 180
 
 
+def test_identify_to_download_resolves_all_particles_in_one_plan():
+    plan = identify_to_download(
+        libraries=["ENDFB-7.1-NNDC", "TENDL-2019"],
+        isotopes=["Li6", "Fe56", "Ag108"],
+        elements=["Li"],
+        sabs=["c_H_in_H2O"],
+    )
+
+    assert plan["particle"].tolist() == [
+        "neutron",
+        "neutron",
+        "neutron",
+        "photon",
+        "sab",
+    ]
+    # Ag108 is only in TENDL-2019 so falls back to the second library
+    assert plan["library"].tolist() == [
+        "ENDFB-7.1-NNDC",
+        "ENDFB-7.1-NNDC",
+        "TENDL-2019",
+        "ENDFB-7.1-NNDC",
+        "ENDFB-7.1-NNDC",
+    ]
+    assert plan["priority"].tolist() == [1, 1, 2, 1, 1]
+    assert plan["url"].is_unique
+
+
+def test_identify_to_download_matches_the_per_particle_functions():
+    libraries = ["FENDL-3.1d", "TENDL-2019"]
+    plan = identify_to_download(libraries=libraries, isotopes="stable")
+    isotopes_df = identify_isotopes_to_download(libraries=libraries, isotopes="stable")
+
+    assert plan["local_file"].tolist() == isotopes_df["local_file"].tolist()
+    assert list(isotopes_df.keys()) == [
+        "library",
+        "remote_file",
+        "url",
+        "local_file",
+        "particle",
+        "isotope",
+        "element",
+        "priority",
+    ]
+
+
+def test_identify_to_download_does_not_modify_the_shared_frame():
+    first = identify_to_download(libraries=["TENDL-2019"], isotopes=["Li6"])
+    first["priority"] = 10
+    second = identify_to_download(libraries=["TENDL-2019"], isotopes=["Li6"])
+
+    assert second["priority"].tolist() == [1]
+
+
+@pytest.mark.parametrize(
+    "libraries",
+    [["TENDL-2019"], ["ENDFB-8.0-NNDC", "FENDL-3.1d", "TENDL-2019"]],
+)
+@pytest.mark.parametrize(
+    "isotopes", [["Li6", "Li7", "Fe56", "Ag108", "not_an_isotope"], "stable", []]
+)
+def test_identify_to_download_index_and_dataframe_give_the_same_plan(
+    libraries, isotopes
+):
+    requested = {"isotopes": isotopes, "elements": ["Fe", "H"], "sabs": ["c_Be"]}
+    index_plan = identify_to_download(libraries, method="index", **requested)
+    dataframe_plan = identify_to_download(libraries, method="dataframe", **requested)
+
+    assert index_plan.equals(dataframe_plan)
+    assert list(index_plan.index) == list(dataframe_plan.index)
+
+
+def test_identify_to_download_incorrect_method():
+    with pytest.raises(ValueError):
+        identify_to_download(["TENDL-2019"], isotopes=["Li6"], method="coucou")
+
+
 def test_expand_materials_from_object_list_with_single_mat():
     my_mat = openmc.Material()
     my_mat.add_nuclide("Pu239", 3.7047e-2)
@@ -192,6 +275,23 @@ def test_expand_materials_from_object_list_with_openmc_materials():
     assert expand_materials_to_isotopes(mats) == ["Al27", "Li6", "Li7"]
 
 
+def test_expand_materials_finds_nuclides_elements_and_sabs():
+    my_mat1 = openmc.Material()
+    my_mat1.add_nuclide("Li6", 0.5)
+    my_mat1.add_nuclide("Am242_m1", 0.25)
+    my_mat1.add_s_alpha_beta("c_H_in_H2O")
+
+    my_mat2 = openmc.Material()
+    my_mat2.add_nuclide("Li7", 0.25)
+    my_mat2.add_s_alpha_beta("c_H_in_H2O")
+
+    isotopes, elements, sabs = expand_materials(openmc.Materials([my_mat1, my_mat2]))
+
+    assert isotopes == {"Li6", "Li7", "Am242_m1"}
+    assert elements == {"Li", "Am"}
+    assert sabs == {"c_H_in_H2O"}
+
+
 def test_expand_material_xmls_for_sabs_with_sab():
     my_mat = openmc.Material()
     my_mat.add_element("Be", 0.5)
@@ -252,6 +352,16 @@ def test_incorrect_library_name_for_sab_identifying():
         identify_sabs_to_download(libraries=["incorrect name"], sabs=["c_Fe56"])
 
 
+def test_incorrect_overwrite_with_partition(tmp_path):
+    my_mat = openmc.Material()
+    my_mat.add_nuclide("Li6", 0.5)
+
+    with pytest.raises(ValueError):
+        openmc.Materials([my_mat]).download_cross_section_data(
+            destination=tmp_path, overwrite=True, partition=(0, 2)
+        )
+
+
 def test_library_values_single_entry_list():
     isotopes_df = identify_isotopes_to_download(
         libraries=["TENDL-2019"], isotopes=["Al27", "Li6"]
@@ -309,3 +419,156 @@ def test_download_single_file_with_overwrite_speed_up():
     time_to_not_download = time_after_download - current_time
 
     assert time_to_not_download < time_to_download
+
+
+def test_materials_methods_registered_when_openmc_imported_after():
+    code = (
+        "import openmc_data_downloader\n"
+        "import openmc\n"
+        "assert openmc.Materials.download_cross_section_data is "
+        "openmc_data_downloader.download_cross_section_data\n"
+        "assert openmc.Materials.download_cross_section_data_async is "
+        "openmc_data_downloader.download_cross_section_data_async\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_materials_methods_registered_when_openmc_found_before_import():
+    code = (
+        "import importlib.util\n"
+        "import openmc_data_downloader\n"
+        "assert importlib.util.find_spec('openmc') is not None\n"
+        "import openmc\n"
+        "assert openmc.Materials.download_cross_section_data is "
+        "openmc_data_downloader.download_cross_section_data\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_create_cross_sections_xml_from_catalog(tmp_path):
+    plan = identify_to_download(
+        libraries=["ENDFB-7.1-NNDC"],
+        isotopes=["Li6", "Am242_m1"],
+        elements=["Fe"],
+        sabs=["c_H_in_H2O"],
+    )
+
+    xml_path = create_cross_sections_xml(plan, tmp_path, from_catalog=True)
+
+    assert xml_path == str((tmp_path / "cross_sections.xml").absolute())
+    entries = [elem.attrib for elem in ET.parse(xml_path).getroot()]
+    assert entries == [
+        {
+            "materials": "Am242_m1",
+            "path": "ENDFB-7.1-NNDC_Am242_m1.h5",
+            "type": "neutron",
+        },
+        {
+            "materials": "Li6",
+            "path": "ENDFB-7.1-NNDC_Li6.h5",
+            "type": "neutron",
+        },
+        {
+            "materials": "Fe",
+            "path": "ENDFB-7.1-NNDC_Fe.h5",
+            "type": "photon",
+        },
+        {
+            "materials": "c_H_in_H2O",
+            "path": "ENDFB-7.1-NNDC_c_H_in_H2O.h5",
+            "type": "thermal",
+        },
+    ]
+
+
+def test_create_cross_sections_xml_verify_checks_the_files(tmp_path):
+    h5py = pytest.importorskip("h5py")
+
+    plan = identify_to_download(
+        libraries=["ENDFB-7.1-NNDC"], isotopes=["Li6"], sabs=["c_H_in_H2O"]
+    )
+    for local_file, name, file_type in [
+        ("ENDFB-7.1-NNDC_Li6.h5", "Li6", "neutron"),
+        ("ENDFB-7.1-NNDC_c_H_in_H2O.h5", "c_H_in_H2O", "neutron"),
+    ]:
+        with h5py.File(tmp_path / local_file, "w") as h5_file:
+            h5_file.attrs["filetype"] = f"data_{file_type}".encode()
+            h5_file.create_group(name)
+
+    with pytest.raises(RuntimeError, match="1 of 2 files"):
+        create_cross_sections_xml(plan, tmp_path, from_catalog=True, verify=True)
+
+    with h5py.File(tmp_path / "ENDFB-7.1-NNDC_c_H_in_H2O.h5", "a") as h5_file:
+        h5_file.attrs["filetype"] = b"data_thermal"
+
+    create_cross_sections_xml(plan, tmp_path, from_catalog=True, verify=True)
+
+
+def test_create_cross_sections_xml_verify_checks_the_files_in_processes(
+    tmp_path, monkeypatch
+):
+    h5py = pytest.importorskip("h5py")
+    from openmc_data_downloader import utils
+
+    monkeypatch.setattr(utils, "_VERIFY_FILES_PER_PROCESS", 1)
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+
+    plan = identify_to_download(libraries=["ENDFB-7.1-NNDC"], isotopes=["Li6", "Li7"])
+    for local_file, name, file_type in [
+        ("ENDFB-7.1-NNDC_Li6.h5", "Li6", "neutron"),
+        ("ENDFB-7.1-NNDC_Li7.h5", "Li7", "photon"),
+    ]:
+        with h5py.File(tmp_path / local_file, "w") as h5_file:
+            h5_file.attrs["filetype"] = f"data_{file_type}".encode()
+            h5_file.create_group(name)
+
+    with pytest.raises(RuntimeError, match="1 of 2 files"):
+        create_cross_sections_xml(plan, tmp_path, from_catalog=True, verify=True)
+
+
+def test_create_cross_sections_xml_merge_adds_to_the_existing_file(tmp_path):
+    first_plan = identify_to_download(libraries=["TENDL-2019"], isotopes=["Li6"])
+    create_cross_sections_xml(first_plan, tmp_path, from_catalog=True)
+
+    second_plan = identify_to_download(
+        libraries=["ENDFB-7.1-NNDC", "TENDL-2019"], isotopes=["Li6", "Li7"]
+    )
+    xml_path = create_cross_sections_xml(
+        second_plan, tmp_path, from_catalog=True, merge=True
+    )
+
+    # Li6 from the higher priority library replaces the earlier entry
+    entries = [elem.attrib["path"] for elem in ET.parse(xml_path).getroot()]
+    assert entries == ["ENDFB-7.1-NNDC_Li6.h5", "ENDFB-7.1-NNDC_Li7.h5"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["cross_sections.xml"]
+
+    third_plan = identify_to_download(libraries=["TENDL-2019"], isotopes=["Be9"])
+    create_cross_sections_xml(third_plan, tmp_path, from_catalog=True, merge=True)
+
+    entries = [elem.attrib["path"] for elem in ET.parse(xml_path).getroot()]
+    assert entries == [
+        "ENDFB-7.1-NNDC_Li6.h5",
+        "ENDFB-7.1-NNDC_Li7.h5",
+        "TENDL-2019_Be9.h5",
+    ]
+
+
+def test_create_cross_sections_xml_merge_keeps_higher_priority_entries(tmp_path):
+    first_plan = identify_to_download(libraries=["ENDFB-7.1-NNDC"], isotopes=["Li6"])
+    create_cross_sections_xml(first_plan, tmp_path, from_catalog=True)
+
+    # a plan preferring ENDFB-7.1-NNDC that lists Li6 from TENDL-2019
+    second_plan = pd.concat(
+        [
+            identify_to_download(libraries=["ENDFB-7.1-NNDC"], isotopes=["Li7"]),
+            identify_to_download(libraries=["TENDL-2019"], isotopes=["Li6"]).assign(
+                priority=2
+            ),
+        ]
+    )
+    xml_path = create_cross_sections_xml(
+        second_plan, tmp_path, from_catalog=True, merge=True
+    )
+
+    entries = [elem.attrib["path"] for elem in ET.parse(xml_path).getroot()]
+    assert entries == ["ENDFB-7.1-NNDC_Li6.h5", "ENDFB-7.1-NNDC_Li7.h5"]